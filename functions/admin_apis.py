@@ -2,21 +2,17 @@
 
 from firebase_functions import https_fn
 from firebase_admin import db
-import time
-import os
 
-# Helper function to determine if running in emulator
-def is_emulator():
-    return os.getenv('FUNCTIONS_EMULATOR') == 'true'
 from utils import (
-    validate_game_phase,
+    ENFORCE_APP_CHECK,
+    SERVER_TIMESTAMP,
+    add_player_last_connected,
+    now_ms,
     verify_game_admin,
-    validate_game_structure,
-    update_player_last_connected,
 )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
 def update_topic(req: https_fn.CallableRequest) -> dict:
     """
     ゲームのトピックを更新する
@@ -47,33 +43,37 @@ def update_topic(req: https_fn.CallableRequest) -> dict:
         # 管理者権限チェック
         verify_game_admin(user_id, game_id)
 
-        # ゲームデータを取得
+        # 必要なフィールドのみ取得（ゲーム全体のダウンロードを避ける）
         db_ref = db.reference()
         game_ref = db_ref.child("games").child(game_id)
-        game_data = game_ref.get()
+        phase = game_ref.child("state").child("phase").get()
 
-        try:
-            validate_game_structure(game_data)
-        except ValueError as e:
+        if phase is None:
             raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT, message=str(e)
+                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
+                message="Game data is missing",
             )
 
         # ゲームのphaseをチェック（phase 0のみ許可）
-        try:
-            validate_game_phase(game_data, 0)
-        except ValueError as e:
+        if phase != 0:
             raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.FAILED_PRECONDITION, message=str(e)
+                code=https_fn.FunctionsErrorCode.FAILED_PRECONDITION,
+                message=f"Invalid game phase: expected 0, got {phase}",
             )
 
-        # Update last connected in players/$playerId
-        update_player_last_connected(user_id)
+        # 既存トピックと同じ場合は書き込み（とリスナーへのファンアウト）を省略
+        current_topic = game_ref.child("state").child("config").child("topic").get()
+        if current_topic == new_topic:
+            return {"success": True, "message": "Topic unchanged"}
 
-        # トピックを更新
-        current_time = int(time.time() * 1000)
-        game_ref.child("state").child("config").child("topic").set(new_topic)
-        game_ref.child("lastUpdated").set(current_time)
+        # トピック・lastUpdated・players/{uid}/lastConnectedを
+        # 1回のmulti-path updateにまとめて書き込む
+        updates = {
+            f"games/{game_id}/state/config/topic": new_topic,
+            f"games/{game_id}/lastUpdated": SERVER_TIMESTAMP,
+        }
+        add_player_last_connected(updates, user_id, now_ms())
+        db_ref.update(updates)
 
         return {"success": True, "message": "Topic updated successfully"}
 
@@ -90,7 +90,7 @@ def update_topic(req: https_fn.CallableRequest) -> dict:
         )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
 def kick_player(req: https_fn.CallableRequest) -> dict:
     """
     指定したプレイヤーをキックする
@@ -118,14 +118,15 @@ def kick_player(req: https_fn.CallableRequest) -> dict:
         game_id = request_data["gameId"]
         target_player_id = request_data["playerId"]
 
+        # 必要なフィールドのみ取得（ゲーム全体のダウンロードを避ける）
         db_ref = db.reference()
         game_ref = db_ref.child("games").child(game_id)
-        game_data = game_ref.get()
-        try:
-            validate_game_structure(game_data)
-        except ValueError as e:
+        phase = game_ref.child("state").child("phase").get()
+
+        if phase is None:
             raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT, message=str(e)
+                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
+                message="Game data is missing",
             )
 
         # Check if user is admin
@@ -136,12 +137,14 @@ def kick_player(req: https_fn.CallableRequest) -> dict:
                 code=https_fn.FunctionsErrorCode.PERMISSION_DENIED, message=str(e)
             )
 
-        # Check if target player exists in game
-        phase = game_data["state"]["phase"]
+        # Check if target player exists in game (key existence only: shallow fetch)
         if phase == 0:
-            player_info = game_data["state"]["config"]["playerInfo"]
+            player_info_ref = (
+                game_ref.child("state").child("config").child("playerInfo")
+            )
         else:
-            player_info = game_data["config"]["playerInfo"]
+            player_info_ref = game_ref.child("config").child("playerInfo")
+        player_info = player_info_ref.get(shallow=True) or {}
 
         if target_player_id not in player_info:
             raise https_fn.HttpsError(
@@ -156,15 +159,14 @@ def kick_player(req: https_fn.CallableRequest) -> dict:
                 message="Cannot kick yourself",
             )
 
-        # Update last connected in players/$playerId
-        update_player_last_connected(user_id)
-
-        # Set kicked flag to true
-        current_time = int(time.time() * 1000)
-        game_ref.child("state").child("playerState").child(target_player_id).child(
-            "kicked"
-        ).set(True)
-        game_ref.child("lastUpdated").set(current_time)
+        # Set kicked flag, lastUpdated and the caller's
+        # players/{uid}/lastConnected in one atomic multi-path write
+        updates = {
+            f"games/{game_id}/state/playerState/{target_player_id}/kicked": True,
+            f"games/{game_id}/lastUpdated": SERVER_TIMESTAMP,
+        }
+        add_player_last_connected(updates, user_id, now_ms())
+        db_ref.update(updates)
 
         return {"success": True, "message": "Player kicked successfully"}
 
@@ -1,38 +1,79 @@
-from firebase_functions import https_fn
+from firebase_functions import scheduler_fn
+from firebase_functions.options import MemoryOption
 from firebase_admin import db, auth
-import time
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
-from utils import PLAYER_LIFESPAN, GAME_LIFESPAN
+from utils import PLAYER_LIFESPAN, GAME_LIFESPAN, now_ms
 
 logger = logging.getLogger(__name__)
 
+# Max paths per multi-path update (stay within RTDB write-size limits)
+DELETE_BATCH_SIZE = 500
 
-@https_fn.on_request()
-def cleanup_scheduled(req):
+# Max UIDs per auth.delete_users call (API limit)
+AUTH_DELETE_BATCH_SIZE = 1000
+
+# Min interval between full auth orphan scans (6 hours); the paginated
+# list_users walk is expensive and orphans accumulate slowly
+AUTH_CLEANUP_INTERVAL = 6 * 60 * 60 * 1000
+
+
+def batch_delete(ref, keys):
+    """
+    Delete multiple children under ref with batched multi-path updates
+    (setting a path to None deletes it in RTDB)
+    """
+    for i in range(0, len(keys), DELETE_BATCH_SIZE):
+        chunk = keys[i : i + DELETE_BATCH_SIZE]
+        ref.update({key: None for key in chunk})
+
+
+def batch_delete_auth_accounts(user_ids):
+    """
+    Delete auth accounts in bulk via auth.delete_users (up to 1000 per call)
+    Returns the number of successfully deleted accounts
+    """
+    deleted_count = 0
+    for i in range(0, len(user_ids), AUTH_DELETE_BATCH_SIZE):
+        chunk = user_ids[i : i + AUTH_DELETE_BATCH_SIZE]
+        try:
+            result = auth.delete_users(chunk)
+        except Exception as e:
+            logger.warning(f"Failed to bulk-delete auth accounts: {str(e)}")
+            continue
+
+        deleted_count += result.success_count
+        for error in result.errors:
+            logger.warning(
+                f"Failed to remove auth account {chunk[error.index]}: {error.reason}"
+            )
+
+    return deleted_count
+
+
+@scheduler_fn.on_schedule(schedule="every 1 hours", memory=MemoryOption.MB_512)
+def cleanup_scheduled(event: scheduler_fn.ScheduledEvent) -> None:
     """
-    Cloud Scheduler function to perform periodic cleanup of inactive data
+    Scheduled function to perform periodic cleanup of inactive data
     Runs every hour to clean up players, games, and passwords
     """
     try:
         logger.info("Starting scheduled cleanup")
 
-        # Execute cleanup steps in order
-        players_cleaned = cleanup_players()
-        games_cleaned = cleanup_games()
-        passwords_cleaned = cleanup_passwords()
+        # Run the three stages concurrently (they touch disjoint subtrees)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            players_future = executor.submit(cleanup_players)
+            games_future = executor.submit(cleanup_games)
+            passwords_future = executor.submit(cleanup_passwords)
+            players_cleaned = players_future.result()
+            games_cleaned = games_future.result()
+            passwords_cleaned = passwords_future.result()
 
         logger.info(
             f"Cleanup completed - Players: {players_cleaned}, Games: {games_cleaned}, Passwords: {passwords_cleaned}"
         )
 
-        return {
-            "status": "success",
-            "players_cleaned": players_cleaned,
-            "games_cleaned": games_cleaned,
-            "passwords_cleaned": passwords_cleaned,
-        }
-
     except Exception as e:
         logger.error(f"Cleanup failed: {str(e)}")
         raise
@@ -45,161 +86,129 @@ def cleanup_players():
     """
     db_ref = db.reference()
     players_ref = db_ref.child("players")
-    players_data = players_ref.get()
 
-    if not players_data:
-        return 0
-
-    current_time = int(time.time() * 1000)  # Current time in milliseconds
+    current_time = now_ms()
     cutoff_time = current_time - PLAYER_LIFESPAN  # 1 hour ago
 
-    players_to_remove = []
+    # Server-side filter on the indexed lastConnected field so only stale
+    # players are transferred; players without a lastConnected value sort
+    # before numbers and are therefore included as well
+    stale_players = (
+        players_ref.order_by_child("lastConnected").end_at(cutoff_time).get()
+    )
 
-    # Check each player in the database
-    for player_id, player_data in players_data.items():
-        try:
-            # Check lastConnected from players table
-            if isinstance(player_data, dict):
-                last_connected = player_data.get("lastConnected")
-
-                # If lastConnected doesn't exist or is too old, mark for removal
-                if last_connected is None or last_connected < cutoff_time:
-                    players_to_remove.append(player_id)
-            else:
-                # If player_data is not a dict, mark for removal
-                players_to_remove.append(player_id)
-
-        except auth.UserNotFoundError:
-            # If auth account doesn't exist, remove player from database
-            players_to_remove.append(player_id)
-        except Exception as e:
-            logger.warning(f"Error checking player {player_id}: {str(e)}")
+    players_to_remove = list(stale_players.keys()) if stale_players else []
+
+    # Remove players from database in one batched write, then auth accounts
+    if players_to_remove:
+        batch_delete(players_ref, players_to_remove)
+        logger.info(
+            f"cleanup_players removed {len(players_to_remove)} inactive players",
+            extra={
+                "ids": players_to_remove[:100],
+                "total": len(players_to_remove),
+            },
+        )
 
-    # Remove players from database and their auth accounts
-    for player_id in players_to_remove:
-        # Remove from players database
-        players_ref.child(player_id).delete()
-        logger.info(f"Removed inactive player: {player_id}")
+        batch_delete_auth_accounts(players_to_remove)
 
-        # Remove auth account
-        try:
-            auth.delete_user(player_id)
-            logger.info(f"Removed auth account: {player_id}")
-        except auth.UserNotFoundError:
-            logger.info(f"Auth account {player_id} already deleted")
-        except Exception as e:
-            logger.warning(f"Failed to remove auth account {player_id}: {str(e)}")
+    # Remaining player ids (keys only) for the orphaned-auth scan; computed
+    # here so cleanup_auth_by_signin doesn't re-read players/ itself
+    remaining_players = players_ref.get(shallow=True) or {}
+    existing_player_ids = set(remaining_players.keys()) - set(players_to_remove)
 
     # Additional auth cleanup based on last sign-in time
-    auth_only_cleaned = cleanup_auth_by_signin()
+    auth_only_cleaned = cleanup_auth_by_signin(existing_player_ids)
 
     return len(players_to_remove) + auth_only_cleaned
 
 
-def cleanup_auth_by_signin():
+def cleanup_auth_by_signin(existing_player_ids):
     """
-    Remove anonymous auth accounts whose uid doesn't exist under players/
+    Remove anonymous auth accounts whose uid doesn't exist in existing_player_ids
     This catches orphaned auth accounts that have no corresponding database entry
+    The caller supplies the player-id set so players/ isn't read twice per run
+    Users are iterated lazily and deletions flushed in bounded batches, so
+    memory stays O(batch size) regardless of how many accounts exist
+    Skipped entirely when a full scan ran within AUTH_CLEANUP_INTERVAL
     """
-    auth_accounts_to_remove = []
+    # Skip the paginated list_users walk if a scan ran recently
+    meta_ref = db.reference().child("meta")
+    last_scan = meta_ref.child("lastAuthCleanupAt").get() or 0
+    current_time = now_ms()
+    if current_time - last_scan < AUTH_CLEANUP_INTERVAL:
+        return 0
 
-    # Get players data once for efficiency
-    db_ref = db.reference()
-    players_ref = db_ref.child("players")
-    players_data = players_ref.get() or {}
-    existing_player_ids = set(players_data.keys())
+    removed_count = 0
+    batch = []
+    delete_futures = []
 
     try:
-        # Get all users using pagination
-        page = auth.list_users()
-
-        while page:
-            for user in page.users:
-                # Check if user is anonymous (empty provider_data)
-                if user.provider_data == []:
-                    # If uid doesn't exist in players/, mark for removal
-                    if user.uid not in existing_player_ids:
-                        auth_accounts_to_remove.append(user.uid)
-
-            # Get next page
-            page = page.get_next_page()
+        # Pipeline the pagination: prefetch the next page and run deletion
+        # batches in the background while the current page is filtered
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            page = auth.list_users()
+            while page:
+                next_page_future = executor.submit(page.get_next_page)
+
+                for user in page.users:
+                    # Anonymous (no provider data) and not in players/ → removal
+                    if (
+                        not user.provider_data
+                        and user.uid not in existing_player_ids
+                    ):
+                        batch.append(user.uid)
+                        if len(batch) >= AUTH_DELETE_BATCH_SIZE:
+                            delete_futures.append(
+                                executor.submit(batch_delete_auth_accounts, batch)
+                            )
+                            batch = []
+
+                page = next_page_future.result()
+
+            if batch:
+                delete_futures.append(
+                    executor.submit(batch_delete_auth_accounts, batch)
+                )
+
+            removed_count = sum(future.result() for future in delete_futures)
 
     except Exception as e:
         logger.warning(f"Error listing users for auth cleanup: {str(e)}")
-        return 0
+        return removed_count
 
-    # Remove auth accounts
-    removed_count = 0
-    for user_id in auth_accounts_to_remove:
-        try:
-            auth.delete_user(user_id)
-            logger.info(f"Removed auth account by signin time: {user_id}")
-            removed_count += 1
-        except auth.UserNotFoundError:
-            logger.info(f"Auth account {user_id} already deleted")
-        except Exception as e:
-            logger.warning(f"Failed to remove auth account {user_id}: {str(e)}")
+    # Record the successful scan so consecutive runs can skip it
+    meta_ref.child("lastAuthCleanupAt").set(current_time)
 
     return removed_count
 
 
 def cleanup_games():
     """
-    Remove games that meet cleanup criteria:
-    1. lastUpdated is earlier than 30 seconds ago
-    2. Games that have no players in both config/playerInfo and state/config/playerInfo
+    Remove games whose lastUpdated is earlier than 30 seconds ago
+    Uses an indexed server-side query so only stale games are downloaded;
+    games with no players stop receiving lastUpdated bumps and therefore
+    fall behind the same cutoff
     """
     db_ref = db.reference()
     games_ref = db_ref.child("games")
-    games_data = games_ref.get()
-
-    if not games_data:
-        return 0
 
-    current_time = int(time.time() * 1000)  # Current time in milliseconds
+    current_time = now_ms()
     cutoff_time = current_time - GAME_LIFESPAN  # 30 seconds ago
 
-    games_to_remove = []
+    # Server-side filter on the indexed lastUpdated field; games missing
+    # the field sort before numbers and are included as well
+    stale_games = games_ref.order_by_child("lastUpdated").end_at(cutoff_time).get()
 
-    for game_id, game_data in games_data.items():
-        if not isinstance(game_data, dict):
-            continue
-
-        should_remove = False
-
-        # Check if lastUpdated is older than 30 seconds
-        last_updated = game_data.get("lastUpdated", 0)
-        if last_updated < cutoff_time:
-            should_remove = True
-            logger.info(f"Game {game_id} marked for removal: lastUpdated too old")
-
-        # Check if game has no players in playerInfo
-        if not should_remove:
-            has_players = False
-
-            # Check config/playerInfo (for phase != 0)
-            config = game_data.get("config")
-            if config and config.get("playerInfo"):
-                has_players = True
-
-            # Check state/config/playerInfo (for phase == 0)
-            state = game_data.get("state")
-            if state and isinstance(state, dict):
-                state_config = state.get("config")
-                if state_config and state_config.get("playerInfo"):
-                    has_players = True
-
-            if not has_players:
-                should_remove = True
-                logger.info(f"Game {game_id} marked for removal: no players")
+    games_to_remove = list(stale_games.keys()) if stale_games else []
 
-        if should_remove:
-            games_to_remove.append(game_id)
-
-    # Remove games
-    for game_id in games_to_remove:
-        games_ref.child(game_id).delete()
-        logger.info(f"Removed game: {game_id}")
+    # Remove games in batched multi-path updates
+    if games_to_remove:
+        batch_delete(games_ref, games_to_remove)
+        logger.info(
+            f"cleanup_games removed {len(games_to_remove)} stale games",
+            extra={"ids": games_to_remove[:100], "total": len(games_to_remove)},
+        )
 
     return len(games_to_remove)
 
@@ -221,17 +230,22 @@ def cleanup_passwords():
     # Get set of existing game IDs
     existing_game_ids = set(games_data.keys()) if games_data else set()
 
-    passwords_to_remove = []
+    # Find passwords for non-existent games (values are always gameId strings)
+    passwords_to_remove = [
+        password
+        for password, game_id in passwords_data.items()
+        if game_id not in existing_game_ids
+    ]
 
-    # Find passwords for non-existent games
-    for password, game_id in passwords_data.items():
-        # password_data is just the gameId string
-        if isinstance(game_id, str) and game_id not in existing_game_ids:
-            passwords_to_remove.append(password)
-
-    # Remove orphaned passwords
-    for password in passwords_to_remove:
-        passwords_ref.child(password).delete()
-        logger.info(f"Removed orphaned password: {password}")
+    # Remove orphaned passwords in batched multi-path updates
+    if passwords_to_remove:
+        batch_delete(passwords_ref, passwords_to_remove)
+        logger.info(
+            f"cleanup_passwords removed {len(passwords_to_remove)} orphaned passwords",
+            extra={
+                "ids": passwords_to_remove[:100],
+                "total": len(passwords_to_remove),
+            },
+        )
 
     return len(passwords_to_remove)
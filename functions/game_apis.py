@@ -2,23 +2,60 @@
 
 from firebase_functions import https_fn
 from firebase_admin import db
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import random
 import uuid
-import time
-import os
-# Helper function to determine if running in emulator
-def is_emulator():
-    return os.getenv('FUNCTIONS_EMULATOR') == 'true'
+
+# エラー型・エラーコードをモジュール読み込み時に束縛（ハンドラ内の属性ルックアップ削減）
+_HE = https_fn.HttpsError
+_EC = https_fn.FunctionsErrorCode
+
+# 独立したRTDBリードを並列化するための共有スレッドプール
+_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
+# init_player応答のインスタンス内キャッシュ（ポーリング対策）
+# 数秒以内の再呼び出しはRTDBに触れずに直前の応答を返す
+_INIT_CACHE = {}
+_INIT_CACHE_TTL_MS = 3 * 1000
+_INIT_CACHE_MAX_ENTRIES = 1024
+
+
+# 全ハンドラで共有する遅延初期化のルートReference
+_ROOT = None
+
+
+def _root():
+    global _ROOT
+    if _ROOT is None:
+        _ROOT = db.reference()
+    return _ROOT
+
+
+# gamesサブツリーも同様に遅延初期化で共有する
+_GAMES_REF = None
+
+
+def _games_ref():
+    global _GAMES_REF
+    if _GAMES_REF is None:
+        _GAMES_REF = db.reference("games")
+    return _GAMES_REF
 
 from utils import (
+    now_ms,
+    ENFORCE_APP_CHECK,
+    SERVER_TIMESTAMP,
     AVATAR_MAX,
     AVATAR_MIN,
+    GAME_LIFESPAN,
     verify_game_admin,
-    validate_game_structure,
-    validate_game_phase,
-    validate_player_structure,
+    check_game_structure,
+    check_game_phase,
+    check_player_structure,
     CREATION_RATE_LIMIT_WINDOW_MS,
     CREATION_RATE_LIMIT_THRESHOLD,
+    check_creation_rate_limit,
     PASSWORD_MIN,
     PASSWORD_MAX,
     PASSWORD_LENGTH,
@@ -26,79 +63,151 @@ from utils import (
     VALUE_MAX,
     MAX_PLAYERS,
     update_player_last_connected,
+    LAST_CONNECTED_THROTTLE_MS,
     verify_account_age,
 )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
-def create_game(req: https_fn.CallableRequest) -> dict:
+def callable_with_auth(*, require_game_id=False, check_age=False):
+    """
+    各ハンドラ共通の前処理（認証チェック・アカウント年齢チェック・gameId取得）を
+    まとめるデコレーター
+    ラップされたハンドラは (req, user_id) または (req, user_id, game_id) を受け取る
+    """
+
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(req: https_fn.CallableRequest) -> dict:
+            # For callable functions, use req.auth.uid directly
+            if not req.auth:
+                raise _HE(
+                    code=_EC.UNAUTHENTICATED,
+                    message="Authentication required",
+                )
+
+            user_id = req.auth.uid
+
+            if check_age:
+                # Check account age first
+                try:
+                    verify_account_age(user_id)
+                except ValueError as e:
+                    raise _HE(
+                        code=_EC.FAILED_PRECONDITION,
+                        message=str(e),
+                    )
+
+            if require_game_id:
+                request_data = req.data or {}
+                if "gameId" not in request_data:
+                    raise _HE(
+                        code=_EC.INVALID_ARGUMENT,
+                        message="gameId is required",
+                    )
+                return handler(req, user_id, request_data["gameId"])
+
+            return handler(req, user_id)
+
+        return wrapper
+
+    return decorator
+
+
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
+@callable_with_auth(check_age=True)
+def create_game(req: https_fn.CallableRequest, user_id: str) -> dict:
     """
     新しいゲームを作成する
     """
     try:
-        # For callable functions, use req.auth.uid directly
-        if not req.auth:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
-                message="Authentication required",
+        # レート制限チェック（players/{uid}/rateへのトランザクションで補充と消費を原子的に実行）
+        db_ref = _root()
+        current_time = now_ms()
+        player_ref = db_ref.child("players").child(user_id)
+
+        # インスタンス内の事前チェック：同一インスタンスからの明らかな超過は
+        # RTDBトランザクションに到達する前に弾く（権威はRTDB側のバケット）
+        if not check_creation_rate_limit(user_id, current_time):
+            raise _HE(
+                code=_EC.RESOURCE_EXHAUSTED,
+                message=f"Rate limit exceeded. You can create at most {CREATION_RATE_LIMIT_THRESHOLD} games per {CREATION_RATE_LIMIT_WINDOW_MS // 1000} seconds. Try again in a few seconds",
             )
 
-        user_id = req.auth.uid
+        refill_rate = CREATION_RATE_LIMIT_THRESHOLD / CREATION_RATE_LIMIT_WINDOW_MS
+        rate_result = {}
 
-        # Check account age first
-        try:
-            verify_account_age(user_id)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.FAILED_PRECONDITION, message=str(e)
+        def txn_rate(rate_data):
+            rate_result.clear()
+            rate_data = rate_data or {}
+            tokens = rate_data.get("tokens", CREATION_RATE_LIMIT_THRESHOLD)
+            last_refill = rate_data.get("lastRefill", current_time)
+
+            # 経過時間に応じてトークンを補充（容量30、60秒で満杯に戻る）
+            tokens = min(
+                CREATION_RATE_LIMIT_THRESHOLD,
+                tokens + (current_time - last_refill) * refill_rate,
             )
 
-        # レート制限チェック
-        db_ref = db.reference()
-        current_time = int(time.time() * 1000)
-        player_ref = db_ref.child("players").child(user_id)
-        player_data = player_ref.get() or {}
+            if tokens < 1:
+                rate_result["wait_seconds"] = (
+                    int((1 - tokens) / refill_rate) // 1000 + 1
+                )
+                return https_fn.Abort()
 
-        # TTL期限内でのゲーム作成数をチェック
-        creation_count = player_data.get("creationCount", 0)
-        creation_count_ttl = player_data.get("creationCountTtl", 0)
+            rate_result["ok"] = True
+            return {"tokens": tokens - 1, "lastRefill": current_time}
 
-        # TTLが切れている場合はリセット
-        if current_time > creation_count_ttl:
-            creation_count = 0
+        try:
+            player_ref.child("rate").transaction(txn_rate)
+        except Exception:
+            pass
 
-        if creation_count >= CREATION_RATE_LIMIT_THRESHOLD:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.RESOURCE_EXHAUSTED,
-                message=f"Rate limit exceeded. You can create at most {CREATION_RATE_LIMIT_THRESHOLD} games per {CREATION_RATE_LIMIT_WINDOW_MS // 1000} seconds",
+        if not rate_result.get("ok"):
+            if "wait_seconds" in rate_result:
+                raise _HE(
+                    code=_EC.RESOURCE_EXHAUSTED,
+                    message=f"Rate limit exceeded. You can create at most {CREATION_RATE_LIMIT_THRESHOLD} games per {CREATION_RATE_LIMIT_WINDOW_MS // 1000} seconds. Try again in {rate_result['wait_seconds']} seconds",
+                )
+            raise _HE(
+                code=_EC.INTERNAL,
+                message="Failed to check rate limit",
             )
 
         # Update last connected in players/$playerId
-        update_player_last_connected(user_id)
+        # （レートチェックで計算済みの現在時刻を再利用）
+        update_player_last_connected(user_id, current_time=current_time)
 
-        # ゲームIDと4桁パスワードを生成し、トランザクションで登録
+        # ゲームIDと4桁パスワードを生成し、passwordsルートへの1回のトランザクションで登録
+        # ランダムな開始位置から連続する候補を用意し、最初の空き番号を採番する
         game_id = str(uuid.uuid4())
-        max_retry = 5
-        for _ in range(max_retry):
-            password_int = random.randint(PASSWORD_MIN, PASSWORD_MAX)
-            password = f"{password_int:04d}"
-            password_ref = db_ref.child("passwords").child(password)
-
-            def txn_password(current_value):
-                if current_value is not None:
-                    return https_fn.Abort()
-                return game_id
-
-            try:
-                result = password_ref.transaction(txn_password)
-                if result is not None:
-                    # 登録成功
-                    break
-            except Exception:
-                pass
-        else:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.ALREADY_EXISTS,
+        max_candidates = 5
+        start = random.randint(PASSWORD_MIN, PASSWORD_MAX)
+        candidates = [
+            f"{(start + offset) % (PASSWORD_MAX + 1):04d}"
+            for offset in range(max_candidates)
+        ]
+        allocated = {}
+
+        def txn_password(current_passwords):
+            allocated.clear()
+            passwords = current_passwords or {}
+            for candidate in candidates:
+                if candidate not in passwords:
+                    passwords[candidate] = game_id
+                    allocated["password"] = candidate
+                    return passwords
+            # 候補が全て使用済み
+            return https_fn.Abort()
+
+        try:
+            db_ref.child("passwords").transaction(txn_password)
+        except Exception:
+            allocated.clear()
+
+        password = allocated.get("password")
+        if password is None:
+            raise _HE(
+                code=_EC.ALREADY_EXISTS,
                 message="Failed to generate unique password after several attempts",
             )
 
@@ -112,7 +221,7 @@ def create_game(req: https_fn.CallableRequest) -> dict:
                         user_id: {
                             "name": "",
                             "avatar": random.randint(AVATAR_MIN, AVATAR_MAX),
-                            "entrance": current_time,
+                            "entrance": SERVER_TIMESTAMP,
                         }
                     },
                 },
@@ -120,70 +229,51 @@ def create_game(req: https_fn.CallableRequest) -> dict:
                 "playerState": {
                     user_id: {
                         "hint": "",
-                        "lastConnected": current_time,
+                        "lastConnected": SERVER_TIMESTAMP,
                     }
                 },
             },
-            "lastUpdated": current_time,
+            "lastUpdated": SERVER_TIMESTAMP,
         }
 
-        # データベースにゲームデータを保存
-        db_ref.child("games").child(game_id).set(game_data)
-
-        # プレイヤーのcurrentGameIdを更新
-        db_ref.child("players").child(user_id).child("currentGameId").set(game_id)
-
-        # プレイヤーの作成カウンターを更新
-        new_creation_count = creation_count + 1
-        new_creation_count_ttl = current_time + CREATION_RATE_LIMIT_WINDOW_MS
-        player_ref.child("creationCount").set(new_creation_count)
-        player_ref.child("creationCountTtl").set(new_creation_count_ttl)
+        # ゲームデータとcurrentGameIdを1回のmulti-path updateで保存
+        # （レートのトークンは上のトランザクションで既に消費済み）
+        db_ref.update(
+            {
+                f"games/{game_id}": game_data,
+                f"players/{user_id}/currentGameId": game_id,
+            }
+        )
 
         # 成功レスポンス
         return {"success": True, "gameId": game_id, "password": password}
 
-    except https_fn.HttpsError:
+    except _HE:
         # Re-raise HttpsError as-is
         raise
     except ValueError as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.UNAUTHENTICATED, message=str(e)
+        raise _HE(
+            code=_EC.UNAUTHENTICATED, message=str(e)
         )
     except Exception as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.INTERNAL,
+        raise _HE(
+            code=_EC.INTERNAL,
             message=f"Failed to create game: {str(e)}",
         )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
-def enter_game(req: https_fn.CallableRequest) -> dict:
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
+@callable_with_auth(check_age=True)
+def enter_game(req: https_fn.CallableRequest, user_id: str) -> dict:
     """
     ゲームに参加する（パスワードを使用）
     """
     try:
-        # For callable functions, use req.auth.uid directly
-        if not req.auth:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
-                message="Authentication required",
-            )
-
-        user_id = req.auth.uid
-
-        # Check account age first
-        try:
-            verify_account_age(user_id)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.FAILED_PRECONDITION, message=str(e)
-            )
-
         # リクエストデータの取得と検証
         request_data = req.data or {}
         if "password" not in request_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
+            raise _HE(
+                code=_EC.INVALID_ARGUMENT,
                 message="Password is required",
             )
 
@@ -195,71 +285,59 @@ def enter_game(req: https_fn.CallableRequest) -> dict:
             or len(password) != PASSWORD_LENGTH
             or not password.isdigit()
         ):
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
+            raise _HE(
+                code=_EC.INVALID_ARGUMENT,
                 message=f"Password must be a {PASSWORD_LENGTH}-digit string",
             )
 
         # パスワードからゲームIDを取得
-        db_ref = db.reference()
+        db_ref = _root()
         game_id = db_ref.child("passwords").child(password).get()
 
         if not game_id:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.NOT_FOUND,
+            raise _HE(
+                code=_EC.NOT_FOUND,
                 message="Invalid password",
             )
 
-        # ゲームデータを取得
-        game_data = db_ref.child("games").child(game_id).get()
+        # 必要なフィールドのみ取得（ゲーム全体のダウンロードを避ける）
+        game_ref = _games_ref().child(game_id)
+        phase = game_ref.child("state").child("phase").get()
 
-        try:
-            validate_game_structure(game_data)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT, message=str(e)
+        if phase is None:
+            raise _HE(
+                code=_EC.NOT_FOUND,
+                message="Game not found",
             )
 
-        # プレイヤー数の上限チェック
-        current_players = game_data.get("state", {}).get("playerState", {})
-        if len(current_players) >= MAX_PLAYERS:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.RESOURCE_EXHAUSTED,
-                message="Game is full",
-            )
+        player_node = (
+            game_ref.child("state").child("playerState").child(user_id).get()
+        )
 
         # 既に参加済みかチェック
-        if user_id in current_players:
-            # 既に参加済みの場合、lastConnectedを更新
-            current_time = int(time.time() * 1000)
-            game_ref = db_ref.child("games").child(game_id)
-
-            # lastConnectedを更新
-            player_ref = game_ref.child("state").child("playerState").child(user_id)
-            player_ref.child("lastConnected").set(current_time)
+        if player_node:
+            # 既に参加済みの場合、lastConnected等を1回のmulti-path updateで更新
+            # （タイムスタンプはサーバー側で解決されるセンチネルを使用）
+            updates = {
+                f"games/{game_id}/state/playerState/{user_id}/lastConnected": SERVER_TIMESTAMP,
+                f"games/{game_id}/lastUpdated": SERVER_TIMESTAMP,
+                f"players/{user_id}/currentGameId": game_id,
+            }
 
             # phase == 0 の場合のみentranceを更新
-            phase = game_data.get("state", {}).get("phase", 0)
             if phase == 0:
-                # entranceを更新
-                player_info_ref = (
-                    game_ref.child("state")
-                    .child("config")
-                    .child("playerInfo")
-                    .child(user_id)
-                )
-                player_info_ref.child("entrance").set(current_time)
+                updates[
+                    f"games/{game_id}/state/config/playerInfo/{user_id}/entrance"
+                ] = SERVER_TIMESTAMP
 
-            game_ref.child("lastUpdated").set(current_time)
-            db_ref.child("players").child(user_id).child("currentGameId").set(game_id)
+            db_ref.update(updates)
             return {"success": True, "gameId": game_id}
 
         # 新しいプレイヤーの場合、phase 0のみ許可
-        try:
-            validate_game_phase(game_data, 0)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.FAILED_PRECONDITION,
+        # （定員超過チェックは下のトランザクションが権威的に行う）
+        if phase != 0:
+            raise _HE(
+                code=_EC.FAILED_PRECONDITION,
                 message="New players can only join during matching phase (phase 0)",
             )
 
@@ -267,7 +345,8 @@ def enter_game(req: https_fn.CallableRequest) -> dict:
         update_player_last_connected(user_id)
 
         # 新しいプレイヤーを排他制御で追加
-        current_time = int(time.time() * 1000)
+        # （トランザクションのペイロードのみクライアント時刻を使用）
+        current_time = now_ms()
         player_data = {
             "hint": "",
             "lastConnected": current_time,
@@ -275,9 +354,8 @@ def enter_game(req: https_fn.CallableRequest) -> dict:
         player_info = {
             "name": "",
             "avatar": random.randint(AVATAR_MIN, AVATAR_MAX),
-            "entrance": current_time,
+            "entrance": SERVER_TIMESTAMP,
         }
-        game_ref = db_ref.child("games").child(game_id)
         players_ref = game_ref.child("state").child("playerState")
 
         def txn_add_player(current_players):
@@ -293,33 +371,35 @@ def enter_game(req: https_fn.CallableRequest) -> dict:
         try:
             result = players_ref.transaction(txn_add_player)
             if result is None or user_id not in result:
-                raise https_fn.HttpsError(
-                    code=https_fn.FunctionsErrorCode.RESOURCE_EXHAUSTED,
+                raise _HE(
+                    code=_EC.RESOURCE_EXHAUSTED,
                     message="Game is full or already joined",
                 )
-        except https_fn.HttpsError:
+        except _HE:
             raise
         except Exception:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INTERNAL,
+            raise _HE(
+                code=_EC.INTERNAL,
                 message="Failed to join game",
             )
 
-        # state/config/playerInfo, lastUpdated, currentGameIdは通常通り更新
-        game_ref.child("state").child("config").child("playerInfo").child(user_id).set(
-            player_info
+        # playerInfo・lastUpdated・currentGameIdを1回のmulti-path updateで書き込む
+        db_ref.update(
+            {
+                f"games/{game_id}/state/config/playerInfo/{user_id}": player_info,
+                f"games/{game_id}/lastUpdated": SERVER_TIMESTAMP,
+                f"players/{user_id}/currentGameId": game_id,
+            }
         )
-        game_ref.child("lastUpdated").set(current_time)
-        db_ref.child("players").child(user_id).child("currentGameId").set(game_id)
 
         return {"success": True, "gameId": game_id, "password": password}
 
-    except https_fn.HttpsError:
+    except _HE:
         # Re-raise HttpsError as-is
         raise
     except ValueError as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.UNAUTHENTICATED, message=str(e)
+        raise _HE(
+            code=_EC.UNAUTHENTICATED, message=str(e)
         )
     except Exception as e:
         # More detailed error for debugging
@@ -328,13 +408,14 @@ def enter_game(req: https_fn.CallableRequest) -> dict:
         error_details = (
             f"Failed to enter game: {str(e)}\nTraceback: {traceback.format_exc()}"
         )
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.INTERNAL, message=error_details
+        raise _HE(
+            code=_EC.INTERNAL, message=error_details
         )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
-def start_game(req: https_fn.CallableRequest) -> dict:
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
+@callable_with_auth(require_game_id=True)
+def start_game(req: https_fn.CallableRequest, user_id: str, game_id: str) -> dict:
     """
     ゲームを開始する
     gameIdを引数として受け取り、games/{gameId}/state/phaseを0から1に変更する。
@@ -342,45 +423,26 @@ def start_game(req: https_fn.CallableRequest) -> dict:
     このメソッドを実行できるのはconfig/playerInfo/{playerId}/entranceで値が一番小さいプレイヤーのみ。
     """
     try:
-        # For callable functions, use req.auth.uid directly
-        if not req.auth:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
-                message="Authentication required",
-            )
-
-        user_id = req.auth.uid
-
-        request_data = req.data or {}
-        if "gameId" not in request_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
-                message="gameId is required",
-            )
-
-        game_id = request_data["gameId"]
-
-        # 管理者権限チェック
-        verify_game_admin(user_id, game_id)
-
         # ゲームデータを取得
-        db_ref = db.reference()
-        game_ref = db_ref.child("games").child(game_id)
+        db_ref = _root()
+        game_ref = _games_ref().child(game_id)
         game_data = game_ref.get()
 
-        try:
-            validate_game_structure(game_data)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT, message=str(e)
+        # 構造検証してから管理者権限チェック（スナップショットを再利用し、
+        # verify_game_admin内での二重検証を避ける）
+        error = check_game_structure(game_data)
+        if error:
+            raise _HE(
+                code=_EC.INVALID_ARGUMENT, message=error
             )
 
+        verify_game_admin(user_id, game_id, game_data=game_data)
+
         # phase が 0 の場合のみ実行可能
-        try:
-            validate_game_phase(game_data, 0)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.FAILED_PRECONDITION, message=str(e)
+        error = check_game_phase(game_data, 0)
+        if error:
+            raise _HE(
+                code=_EC.FAILED_PRECONDITION, message=error
             )
 
         # Update last connected in players/$playerId
@@ -389,17 +451,11 @@ def start_game(req: https_fn.CallableRequest) -> dict:
         # Check if game has players
         players = game_data["state"]["playerState"]
 
-        # 1-100のユニーク整数を生成
-        available_values = list(range(VALUE_MIN, VALUE_MAX + 1))
-        random.shuffle(available_values)
-
-        # プレイヤーごとに値を割り当て
-        values = {}
-        for i, player_id in enumerate(players.keys()):
-            values[player_id] = available_values[i]
-
-        # ゲームの状態を更新（一括更新）
-        current_time = int(time.time() * 1000)
+        # 1-100から人数分だけユニークな整数を抽出し、プレイヤーごとに割り当て
+        # （zip + dict構築はC実装で、Pythonレベルのループを省略できる）
+        values = dict(
+            zip(players, random.sample(range(VALUE_MIN, VALUE_MAX + 1), len(players)))
+        )
 
         # state/config から config へのデータ移動
         state_player_info = game_data["state"]["config"]["playerInfo"]
@@ -413,103 +469,85 @@ def start_game(req: https_fn.CallableRequest) -> dict:
                 "state/config": None,  # state.config を削除
                 "state/phase": 1,
                 "values": values,
-                "lastUpdated": current_time,
+                "lastUpdated": SERVER_TIMESTAMP,
             }
         )
 
         return {"success": True, "message": "Game started successfully"}
 
-    except https_fn.HttpsError:
+    except _HE:
         # Re-raise HttpsError as-is
         raise
     except ValueError as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.PERMISSION_DENIED, message=str(e)
+        raise _HE(
+            code=_EC.PERMISSION_DENIED, message=str(e)
         )
     except Exception as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.INTERNAL, message="Failed to start game"
+        raise _HE(
+            code=_EC.INTERNAL, message="Failed to start game"
         )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
-def end_game(req: https_fn.CallableRequest) -> dict:
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
+@callable_with_auth(require_game_id=True)
+def end_game(req: https_fn.CallableRequest, user_id: str, game_id: str) -> dict:
     """
     ゲームを終了する
     gameIdを引数として受け取り、games/{gameId}/state/phaseを2に変更する。
     このメソッドを実行できるのはconfig/playerInfo/{playerId}/entranceで値が一番小さいプレイヤーのみ。
     """
     try:
-        # For callable functions, use req.auth.uid directly
-        if not req.auth:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
-                message="Authentication required",
-            )
-
-        user_id = req.auth.uid
-
-        request_data = req.data or {}
-        if "gameId" not in request_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
-                message="gameId is required",
-            )
-
-        game_id = request_data["gameId"]
-
-        # 管理者権限チェック
-        verify_game_admin(user_id, game_id)
-
         # ゲームデータを取得
-        db_ref = db.reference()
-        game_ref = db_ref.child("games").child(game_id)
+        db_ref = _root()
+        game_ref = _games_ref().child(game_id)
         game_data = game_ref.get()
 
-        try:
-            validate_game_structure(game_data)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT, message=str(e)
+        # 構造検証してから管理者権限チェック（スナップショットを再利用し、
+        # verify_game_admin内での二重検証を避ける）
+        error = check_game_structure(game_data)
+        if error:
+            raise _HE(
+                code=_EC.INVALID_ARGUMENT, message=error
             )
 
+        verify_game_admin(user_id, game_id, game_data=game_data)
+
         # phase が 1 の場合のみ実行可能
-        try:
-            validate_game_phase(game_data, 1)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.FAILED_PRECONDITION, message=str(e)
+        error = check_game_phase(game_data, 1)
+        if error:
+            raise _HE(
+                code=_EC.FAILED_PRECONDITION, message=error
             )
 
         # Update last connected in players/$playerId
         update_player_last_connected(user_id)
 
         # ゲームの状態を更新
-        current_time = int(time.time() * 1000)
         game_ref.update(
             {
                 "state/phase": 2,
-                "lastUpdated": current_time,
+                "lastUpdated": SERVER_TIMESTAMP,
             }
         )
 
         return {"success": True, "message": "Game ended successfully"}
 
-    except https_fn.HttpsError:
+    except _HE:
         # Re-raise HttpsError as-is
         raise
     except ValueError as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.PERMISSION_DENIED, message=str(e)
+        raise _HE(
+            code=_EC.PERMISSION_DENIED, message=str(e)
         )
     except Exception as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.INTERNAL, message="Failed to end game"
+        raise _HE(
+            code=_EC.INTERNAL, message="Failed to end game"
         )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
-def reset_game(req: https_fn.CallableRequest) -> dict:
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
+@callable_with_auth(require_game_id=True)
+def reset_game(req: https_fn.CallableRequest, user_id: str, game_id: str) -> dict:
     """
     ゲームをリセットする
     gameIdを引数として受け取り、ゲームをphase 0に戻す。
@@ -517,136 +555,116 @@ def reset_game(req: https_fn.CallableRequest) -> dict:
     このメソッドを実行できるのはconfig/playerInfo/{playerId}/entranceで値が一番小さいプレイヤーのみ。
     """
     try:
-        # For callable functions, use req.auth.uid directly
-        if not req.auth:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
-                message="Authentication required",
-            )
-
-        user_id = req.auth.uid
-
-        request_data = req.data or {}
-        if "gameId" not in request_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
-                message="gameId is required",
-            )
-
-        game_id = request_data["gameId"]
-
-        # 管理者権限チェック
-        verify_game_admin(user_id, game_id)
-
-        # ゲームデータを取得
-        db_ref = db.reference()
-        game_ref = db_ref.child("games").child(game_id)
-        game_data = game_ref.get()
-
-        try:
-            validate_game_structure(game_data)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT, message=str(e)
-            )
+        # ゲームデータをETag付きで取得（楽観的排他制御用）
+        db_ref = _root()
+        game_ref = _games_ref().child(game_id)
+        game_data, etag = game_ref.get(etag=True)
+
+        def validate_for_reset(game_data):
+            # 構造検証してから管理者権限チェック（スナップショットを再利用し、
+            # verify_game_admin内での二重検証を避ける）
+            error = check_game_structure(game_data)
+            if error:
+                raise _HE(code=_EC.INVALID_ARGUMENT, message=error)
+
+            verify_game_admin(user_id, game_id, game_data=game_data)
+
+            # phase が 1 または 2 の場合のみ実行可能
+            if game_data["state"]["phase"] not in [1, 2]:
+                raise _HE(
+                    code=_EC.FAILED_PRECONDITION,
+                    message="Game can only be reset during active phases (phase 1 or 2)",
+                )
 
-        # Get current players and config info
-        phase = game_data["state"]["phase"]
+        def build_reset_game(game_data):
+            # Phase 1 or 2: config を state/config に戻し、values を落とした
+            # リセット後のゲーム全体を構築する
+            player_states = {}
+            for player_id, player_state in game_data["state"]["playerState"].items():
+                # Clear hint and submitted, keep lastConnected and kicked status
+                reset_state = {
+                    "hint": "",
+                    "lastConnected": player_state["lastConnected"],
+                }
+                if "kicked" in player_state:
+                    reset_state["kicked"] = player_state["kicked"]
+                player_states[player_id] = reset_state
+
+            return {
+                "password": game_data["password"],
+                "state": {
+                    "config": {
+                        "topic": game_data["config"]["topic"],
+                        "playerInfo": game_data["config"]["playerInfo"],
+                    },
+                    "phase": 0,
+                    "playerState": player_states,
+                },
+                # 条件付き書き込みはサーバー値センチネルに対応しないためクライアント時刻
+                "lastUpdated": now_ms(),
+            }
 
-        # phase が 1 または 2 の場合のみ実行可能
-        if phase not in [1, 2]:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.FAILED_PRECONDITION,
-                message="Game can only be reset during active phases (phase 1 or 2)",
-            )
+        validate_for_reset(game_data)
 
         # Update last connected in players/$playerId
         update_player_last_connected(user_id)
 
-        current_time = int(time.time() * 1000)
-
-        # Prepare the reset data
-        update_data = {
-            "state/phase": 0,
-            "lastUpdated": current_time,
-            "values": None,  # Remove values
-        }
-
-        # Phase 1 or 2: players info in config/playerInfo, need to move back to state/config
-        player_info = game_data["config"]["playerInfo"]
-        topic = game_data["config"]["topic"]
-
-        # Move config back to state/config
-        update_data["state/config/topic"] = topic
-        update_data["state/config/playerInfo"] = player_info
-        update_data["config"] = None  # Remove config
-
-        # Reset playerState: remove hint and submitted for all players
-        player_states = game_data["state"]["playerState"]
-        for player_id in player_states:
-            # Clear hint and submitted, keep lastConnected and kicked status
-            update_data[f"state/playerState/{player_id}/hint"] = ""
-            update_data[f"state/playerState/{player_id}/submitted"] = None
+        # ETag一致時のみ書き込み（read-then-writeの競合で他の更新を潰さない）
+        success, current_value, current_etag = game_ref.set_if_unchanged(
+            etag, build_reset_game(game_data)
+        )
 
-        # Apply all changes atomically
-        game_ref.update(update_data)
+        if not success:
+            # 競合した場合はサーバーが返した最新スナップショットで1回だけ再試行
+            validate_for_reset(current_value)
+            success, _, _ = game_ref.set_if_unchanged(
+                current_etag, build_reset_game(current_value)
+            )
+            if not success:
+                raise _HE(
+                    code=_EC.ABORTED,
+                    message="Game was modified concurrently, please retry",
+                )
 
         return {"success": True, "message": "Game reset successfully"}
 
-    except https_fn.HttpsError:
+    except _HE:
         # Re-raise HttpsError as-is
         raise
     except ValueError as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.PERMISSION_DENIED, message=str(e)
+        raise _HE(
+            code=_EC.PERMISSION_DENIED, message=str(e)
         )
     except Exception as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.INTERNAL, message="Failed to reset game"
+        raise _HE(
+            code=_EC.INTERNAL, message="Failed to reset game"
         )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
-def exit_game(req: https_fn.CallableRequest) -> dict:
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
+@callable_with_auth(require_game_id=True)
+def exit_game(req: https_fn.CallableRequest, user_id: str, game_id: str) -> dict:
     """
     ゲームから退出する
     gameIdを引数として受け取り、games/{gameId}/state/playerState/{userId}を削除し、
     games/{gameId}/lastUpdatedを現在時刻で更新する。
     """
     try:
-        # For callable functions, use req.auth.uid directly
-        if not req.auth:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
-                message="Authentication required",
-            )
-
-        user_id = req.auth.uid
-
-        request_data = req.data or {}
-        if "gameId" not in request_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
-                message="gameId is required",
-            )
-
-        game_id = request_data["gameId"]
-
-        db_ref = db.reference()
-        game_ref = db_ref.child("games").child(game_id)
+        db_ref = _root()
+        game_ref = _games_ref().child(game_id)
         game_data = game_ref.get()
 
         if not game_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.NOT_FOUND,
+            raise _HE(
+                code=_EC.NOT_FOUND,
                 message="Game not found",
             )
 
         # プレイヤーが実際にゲームに参加しているかチェック
         players = game_data.get("state", {}).get("playerState", {})
         if user_id not in players:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
+            raise _HE(
+                code=_EC.INVALID_ARGUMENT,
                 message="Player not in game",
             )
 
@@ -665,76 +683,85 @@ def exit_game(req: https_fn.CallableRequest) -> dict:
         try:
             updated_players = players_ref.transaction(txn_remove_player)
         except Exception:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INTERNAL,
+            raise _HE(
+                code=_EC.INTERNAL,
                 message="Failed to exit game (transaction error)",
             )
 
-        # 全てのプレイヤー関連データを削除
+        # 残りのプレイヤー関連データを1回のマルチパス更新でまとめて削除
+        # （値をNoneにするとRTDBではそのパスが削除される）
         phase = game_data.get("state", {}).get("phase", 0)
 
-        # playerInfoを削除
-        if phase == 0:
-            game_ref.child("state").child("config").child("playerInfo").child(
-                user_id
-            ).delete()
-        else:
-            game_ref.child("config").child("playerInfo").child(user_id).delete()
-
-        # valuesからも削除（存在する場合）
-        values = game_data.get("values", {})
-        if user_id in values:
-            game_ref.child("values").child(user_id).delete()
-
-        # currentGameIdを削除
-        db_ref.child("players").child(user_id).child("currentGameId").delete()
-
-        # 残りプレイヤーがいない場合、ゲームを削除
         if not updated_players or len(updated_players) == 0:
-            # ゲームを削除
-            game_ref.delete()
-            # パスワードマッピングも削除
+            # 残りプレイヤーがいない場合、ゲームとパスワードをまとめて削除
+            updates = {
+                f"games/{game_id}": None,
+                f"players/{user_id}/currentGameId": None,
+            }
             password = game_data.get("password")
             if password:
-                db_ref.child("passwords").child(str(password)).delete()
+                updates[f"passwords/{password}"] = None
+        else:
+            # playerInfoの場所はphaseによって異なる
+            if phase == 0:
+                player_info_path = f"games/{game_id}/state/config/playerInfo/{user_id}"
+            else:
+                player_info_path = f"games/{game_id}/config/playerInfo/{user_id}"
+
+            updates = {
+                player_info_path: None,
+                f"games/{game_id}/lastUpdated": SERVER_TIMESTAMP,
+                f"players/{user_id}/currentGameId": None,
+            }
+
+            # valuesからも削除（存在する場合）
+            values = game_data.get("values", {})
+            if user_id in values:
+                updates[f"games/{game_id}/values/{user_id}"] = None
+
+        db_ref.update(updates)
 
         return {"success": True, "message": "Successfully exited game"}
 
-    except https_fn.HttpsError:
+    except _HE:
         # Re-raise HttpsError as-is
         raise
     except ValueError as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.UNAUTHENTICATED, message=str(e)
+        raise _HE(
+            code=_EC.UNAUTHENTICATED, message=str(e)
         )
     except Exception as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.INTERNAL, message="Failed to exit game"
+        raise _HE(
+            code=_EC.INTERNAL, message="Failed to exit game"
         )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
-def init_player(req: https_fn.CallableRequest) -> dict:
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
+@callable_with_auth()
+def init_player(req: https_fn.CallableRequest, user_id: str) -> dict:
     """
     プレイヤーを初期化し、現在のゲームIDを返す
     """
     try:
-        # For callable functions, use req.auth.uid directly
-        if not req.auth:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
-                message="Authentication required",
-            )
+        # 直近のキャッシュ済み応答があればRTDBに触れずに返す
+        cached = _INIT_CACHE.get(user_id)
+        if cached is not None and now_ms() - cached[0] < _INIT_CACHE_TTL_MS:
+            return cached[1]
 
-        user_id = req.auth.uid
+        def _cache_and_return(result):
+            if len(_INIT_CACHE) >= _INIT_CACHE_MAX_ENTRIES:
+                _INIT_CACHE.clear()
+            _INIT_CACHE[user_id] = (now_ms(), result)
+            return result
 
         # Update last connected in players/$playerId
-        update_player_last_connected(user_id)
+        # （ポーリングされる経路のため書き込みをスロットリング）
+        update_player_last_connected(user_id, throttle_ms=LAST_CONNECTED_THROTTLE_MS)
 
         # Use auth.uid directly
         uid = user_id
 
-        db_ref = db.reference()
+        db_ref = _root()
 
         # Check players/$uid/currentGameId
         current_game_id = (
@@ -742,146 +769,137 @@ def init_player(req: https_fn.CallableRequest) -> dict:
         )
 
         if not current_game_id:
-            return {"success": True, "gameId": None}
+            return _cache_and_return({"success": True, "gameId": None})
 
-        # Check if games/$currentGame exists
-        game_ref = db_ref.child("games").child(current_game_id)
-        game_data = game_ref.get()
+        # Check if games/$currentGame exists（必要なフィールドのみ取得）
+        game_ref = _games_ref().child(current_game_id)
+        last_updated = game_ref.child("lastUpdated").get()
 
-        if not game_data:
+        if last_updated is None:
             # Game doesn't exist, cleanup currentGameId
             db_ref.child("players").child(uid).child("currentGameId").delete()
-            return {"success": True, "gameId": None}
+            return _cache_and_return({"success": True, "gameId": None})
 
         # Check if games/$currentGame/lastUpdated is older than 30 seconds
-        current_time = int(time.time() * 1000)
-        last_updated = game_data.get("lastUpdated", 0)
-
-        from utils import GAME_LIFESPAN
+        current_time = now_ms()
 
         if current_time - last_updated > GAME_LIFESPAN:
             # Game is too old, cleanup currentGameId
             db_ref.child("players").child(uid).child("currentGameId").delete()
-            return {"success": True, "gameId": None}
+            return _cache_and_return({"success": True, "gameId": None})
 
         # Check if games/$currentGame/state/playerState/$uid exists
-        player_in_game = game_data.get("state", {}).get("playerState", {}).get(uid)
+        player_in_game = (
+            game_ref.child("state").child("playerState").child(uid).get()
+        )
 
         if not player_in_game:
             # Player not in game, cleanup currentGameId
             db_ref.child("players").child(uid).child("currentGameId").delete()
-            return {"success": True, "gameId": None}
+            return _cache_and_return({"success": True, "gameId": None})
 
         # Validate player data structure
-        try:
-            validate_player_structure(player_in_game)
-        except ValueError:
+        if check_player_structure(player_in_game):
             # Invalid player data structure, cleanup currentGameId
             db_ref.child("players").child(uid).child("currentGameId").delete()
-            return {"success": True, "gameId": None}
+            return _cache_and_return({"success": True, "gameId": None})
 
         # Check if player is kicked
         if player_in_game.get("kicked", False):
             # Player is kicked, cleanup currentGameId
             db_ref.child("players").child(uid).child("currentGameId").delete()
-            return {"success": True, "gameId": None}
+            return _cache_and_return({"success": True, "gameId": None})
 
         # All validations passed, return gameId
-        return {"success": True, "gameId": current_game_id}
+        return _cache_and_return({"success": True, "gameId": current_game_id})
 
     except ValueError as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.UNAUTHENTICATED, message=str(e)
+        raise _HE(
+            code=_EC.UNAUTHENTICATED, message=str(e)
         )
     except Exception as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.INTERNAL,
+        raise _HE(
+            code=_EC.INTERNAL,
             message="Failed to initialize player",
         )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
-def get_game_config(req: https_fn.CallableRequest) -> dict:
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
+@callable_with_auth(require_game_id=True)
+def get_game_config(
+    req: https_fn.CallableRequest, player_id: str, game_id: str
+) -> dict:
     """
     ゲームの設定と値を取得する
     """
     try:
-        # For callable functions, use req.auth.uid directly
-        if not req.auth:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
-                message="Authentication required",
-            )
-
-        player_id = req.auth.uid
-
-        # gameIdを取得
-        request_data = req.data or {}
-        if "gameId" not in request_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
-                message="gameId is required",
-            )
-
-        game_id = request_data["gameId"]
-
-        db_ref = db.reference()
+        db_ref = _root()
+        game_ref = _games_ref().child(game_id)
+
+        # 検証に必要なフィールドを並列に取得（RTTを重ねて合計待ち時間を短縮）
+        last_updated_future = _EXECUTOR.submit(game_ref.child("lastUpdated").get)
+        phase_future = _EXECUTOR.submit(game_ref.child("state").child("phase").get)
+        player_future = _EXECUTOR.submit(
+            game_ref.child("state").child("playerState").child(player_id).get
+        )
 
         # Check if games/$gameId exists
-        game_ref = db_ref.child("games").child(game_id)
-        game_data = game_ref.get()
+        last_updated = last_updated_future.result()
 
-        if not game_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.NOT_FOUND, message="Game not found"
+        if last_updated is None:
+            phase_future.result()
+            player_future.result()
+            raise _HE(
+                code=_EC.NOT_FOUND, message="Game not found"
             )
 
         # Check if games/$gameId/lastUpdated is older than 30 seconds
-        current_time = int(time.time() * 1000)
-        last_updated = game_data.get("lastUpdated", 0)
-
-        from utils import GAME_LIFESPAN
+        current_time = now_ms()
 
         if current_time - last_updated > GAME_LIFESPAN:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.DEADLINE_EXCEEDED,
+            raise _HE(
+                code=_EC.DEADLINE_EXCEEDED,
                 message="Game expired",
             )
 
         # Check if games/$gameId/state/playerState/$playerId exists
-        player_in_game = (
-            game_data.get("state", {}).get("playerState", {}).get(player_id)
-        )
+        player_in_game = player_future.result()
 
         if not player_in_game:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.NOT_FOUND, message="Player not in game"
+            raise _HE(
+                code=_EC.NOT_FOUND, message="Player not in game"
             )
 
         # Check if player is kicked
         if player_in_game.get("kicked", False):
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.PERMISSION_DENIED,
+            raise _HE(
+                code=_EC.PERMISSION_DENIED,
                 message="Player has been kicked",
             )
 
         # Update last connected in players/$playerId
-        update_player_last_connected(player_id)
-
-        # Get game state and config
-        game_state = game_data.get("state", {})
-        game_config = game_data.get("config", {})
-        phase = game_state.get("phase", 0)
-        values = game_data.get("values", {})
+        # （ポーリングされる経路のため書き込みをスロットリング）
+        update_player_last_connected(player_id, throttle_ms=LAST_CONNECTED_THROTTLE_MS)
 
-        # Determine what values to return based on phase
+        # phaseに応じて必要なvalues/configのみ並列取得
+        phase = phase_future.result() or 0
+        config_future = _EXECUTOR.submit(game_ref.child("config").get)
         if phase >= 2:
             # Phase 2 or higher: return all values
-            return_values = values
+            values_future = _EXECUTOR.submit(game_ref.child("values").get)
         else:
             # Phase less than 2: return only the current player's value
+            values_future = _EXECUTOR.submit(
+                game_ref.child("values").child(player_id).get
+            )
+
+        game_config = config_future.result() or {}
+        if phase >= 2:
+            return_values = values_future.result() or {}
+        else:
+            player_value = values_future.result()
             return_values = (
-                {player_id: values.get(player_id)} if player_id in values else {}
+                {player_id: player_value} if player_value is not None else {}
             )
 
         # Return success response
@@ -892,193 +910,155 @@ def get_game_config(req: https_fn.CallableRequest) -> dict:
         }
 
     except ValueError as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.UNAUTHENTICATED, message=str(e)
+        raise _HE(
+            code=_EC.UNAUTHENTICATED, message=str(e)
         )
     except Exception as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.INTERNAL,
+        raise _HE(
+            code=_EC.INTERNAL,
             message="Failed to get game config",
         )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
-def get_value(req: https_fn.CallableRequest) -> dict:
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
+@callable_with_auth(require_game_id=True)
+def get_value(req: https_fn.CallableRequest, user_id: str, game_id: str) -> dict:
     """
     プレイヤーの値を取得する
     """
     try:
-        # For callable functions, use req.auth.uid directly
-        if not req.auth:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
-                message="Authentication required",
-            )
-
-        user_id = req.auth.uid
+        game_ref = _games_ref().child(game_id)
 
-        # リクエストデータの取得
-        request_data = req.data or {}
-        if "gameId" not in request_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
-                message="gameId is required",
-            )
-
-        game_id = request_data["gameId"]
+        # 独立した4フィールドを並列で取得（ゲーム全体のダウンロードと
+        # 全構造検証を省略し、各フィールドの存在チェックで代替する）
+        phase_future = _EXECUTOR.submit(game_ref.child("state").child("phase").get)
+        player_future = _EXECUTOR.submit(
+            game_ref.child("state").child("playerState").child(user_id).get
+        )
+        value_future = _EXECUTOR.submit(game_ref.child("values").child(user_id).get)
+        last_updated_future = _EXECUTOR.submit(game_ref.child("lastUpdated").get)
 
-        db_ref = db.reference()
-        game_ref = db_ref.child("games").child(game_id)
-        game_data = game_ref.get()
+        phase = phase_future.result()
+        player_data = player_future.result()
+        player_value = value_future.result()
+        last_updated = last_updated_future.result()
 
         # ゲームの存在確認
-        if not game_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.NOT_FOUND, message="Game not found"
-            )
-
-        # ゲーム構造の検証
-        try:
-            validate_game_structure(game_data)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT, message=str(e)
+        if phase is None:
+            raise _HE(
+                code=_EC.NOT_FOUND, message="Game not found"
             )
 
         # phase != 0 でのみ値を取得可能
-        if game_data["state"]["phase"] == 0:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.FAILED_PRECONDITION,
+        if phase == 0:
+            raise _HE(
+                code=_EC.FAILED_PRECONDITION,
                 message="Values are not available during matching phase",
             )
 
         # プレイヤーがゲームに参加しているかチェック
-        players = game_data["state"]["playerState"]
-        if user_id not in players:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.NOT_FOUND,
+        if not player_data:
+            raise _HE(
+                code=_EC.NOT_FOUND,
                 message="Player not found in game",
             )
 
         # プレイヤーがキックされていないかチェック
-        player_data = players[user_id]
         if player_data.get("kicked", False):
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.PERMISSION_DENIED,
+            raise _HE(
+                code=_EC.PERMISSION_DENIED,
                 message="Player has been kicked from the game",
             )
 
         # valuesの存在確認
-        values = game_data.get("values", {})
-        if user_id not in values:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.NOT_FOUND,
+        if player_value is None:
+            raise _HE(
+                code=_EC.NOT_FOUND,
                 message="Value not assigned to player",
             )
 
         # ゲームの期限切れチェック
-        current_time = int(time.time() * 1000)
-        last_updated = game_data.get("lastUpdated", 0)
-        from utils import GAME_LIFESPAN
+        current_time = now_ms()
 
-        if current_time - last_updated > GAME_LIFESPAN:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.DEADLINE_EXCEEDED,
+        if current_time - (last_updated or 0) > GAME_LIFESPAN:
+            raise _HE(
+                code=_EC.DEADLINE_EXCEEDED,
                 message="Game has expired",
             )
 
         # Update last connected in players/$playerId
-        update_player_last_connected(user_id)
+        update_player_last_connected(user_id, current_time=current_time)
 
         # 値を返す
-        player_value = values[user_id]
         return {"success": True, "gameId": game_id, "value": player_value}
 
-    except https_fn.HttpsError:
+    except _HE:
         # Re-raise HttpsError as-is
         raise
     except Exception as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.INTERNAL, message="Failed to get value"
+        raise _HE(
+            code=_EC.INTERNAL, message="Failed to get value"
         )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
-def get_game_info(req: https_fn.CallableRequest) -> dict:
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
+@callable_with_auth(require_game_id=True)
+def get_game_info(req: https_fn.CallableRequest, user_id: str, game_id: str) -> dict:
     """
     ゲーム情報を取得する
     gameIdを引数として受け取り、gameIdとpasswordを返す。
     """
     try:
-        # For callable functions, use req.auth.uid directly
-        if not req.auth:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
-                message="Authentication required",
-            )
-
-        user_id = req.auth.uid
+        game_ref = _games_ref().child(game_id)
 
-        # gameIdを取得
-        request_data = req.data or {}
-        if "gameId" not in request_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
-                message="gameId is required",
-            )
-
-        game_id = request_data["gameId"]
+        # 必要な3フィールドのみ並列で取得（ゲーム全体のダウンロードを避ける）
+        password_future = _EXECUTOR.submit(game_ref.child("password").get)
+        last_updated_future = _EXECUTOR.submit(game_ref.child("lastUpdated").get)
+        player_future = _EXECUTOR.submit(
+            game_ref.child("state").child("playerState").child(user_id).get
+        )
 
-        db_ref = db.reference()
+        password = password_future.result()
+        last_updated = last_updated_future.result()
+        player_in_game = player_future.result()
 
         # Check if games/$gameId exists
-        game_ref = db_ref.child("games").child(game_id)
-        game_data = game_ref.get()
-
-        if not game_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.NOT_FOUND, message="Game not found"
+        if password is None and last_updated is None:
+            raise _HE(
+                code=_EC.NOT_FOUND, message="Game not found"
             )
 
         # Check if games/$gameId/lastUpdated is older than 30 seconds
-        current_time = int(time.time() * 1000)
-        last_updated = game_data.get("lastUpdated", 0)
+        current_time = now_ms()
 
-        from utils import GAME_LIFESPAN
-
-        if current_time - last_updated > GAME_LIFESPAN:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.DEADLINE_EXCEEDED,
+        if current_time - (last_updated or 0) > GAME_LIFESPAN:
+            raise _HE(
+                code=_EC.DEADLINE_EXCEEDED,
                 message="Game expired",
             )
 
         # Check if games/$gameId/state/playerState/$playerId exists
-        player_in_game = game_data.get("state", {}).get("playerState", {}).get(user_id)
-
         if not player_in_game:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.NOT_FOUND, message="Player not in game"
+            raise _HE(
+                code=_EC.NOT_FOUND, message="Player not in game"
             )
 
         # Check if player is kicked
         if player_in_game.get("kicked", False):
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.PERMISSION_DENIED,
+            raise _HE(
+                code=_EC.PERMISSION_DENIED,
                 message="Player has been kicked",
             )
 
         # Update last connected in players/$playerId
-        update_player_last_connected(user_id)
-
-        # Get password
-        password = game_data.get("password")
+        update_player_last_connected(user_id, current_time=current_time)
 
         return {"success": True, "gameId": game_id, "password": password}
 
-    except https_fn.HttpsError:
+    except _HE:
         # Re-raise HttpsError as-is
         raise
     except Exception as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.INTERNAL, message="Failed to get game info"
+        raise _HE(
+            code=_EC.INTERNAL, message="Failed to get game info"
         )
@@ -2,24 +2,199 @@
 
 from firebase_functions import https_fn
 from firebase_admin import db
-import time
-import os
+from concurrent.futures import ThreadPoolExecutor
 
 from utils import (
     AVATAR_MIN,
     AVATAR_MAX,
-    get_and_validate_player,
-    update_player_last_connected,
-    validate_game_structure,
+    ENFORCE_APP_CHECK,
+    apply_player_mutation,
+    check_player_structure,
+    now_ms,
+    player_info_path,
 )
 
 
-# Helper function to determine if running in emulator
-def is_emulator():
-    return os.getenv("FUNCTIONS_EMULATOR") == "true"
+# 独立したRTDBリードを並列化するための共有スレッドプール
+_EXECUTOR = ThreadPoolExecutor(max_workers=4)
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
+_HE = https_fn.HttpsError
+_EC = https_fn.FunctionsErrorCode
+
+# メッセージが固定のエラーはモジュールロード時に1度だけ生成して使い回す
+# （エラーパスごとのHttpsError構築と文字列生成を省く）
+_ERR_AUTH = _HE(code=_EC.UNAUTHENTICATED, message="Authentication required")
+_ERR_GAME_ID_REQUIRED = _HE(code=_EC.INVALID_ARGUMENT, message="gameId is required")
+_ERR_NAME_REQUIRED = _HE(
+    code=_EC.INVALID_ARGUMENT, message="Name and gameId are required"
+)
+_ERR_HINT_REQUIRED = _HE(
+    code=_EC.INVALID_ARGUMENT, message="Hint and gameId are required"
+)
+_ERR_AVATAR_REQUIRED = _HE(
+    code=_EC.INVALID_ARGUMENT, message="Avatar and gameId are required"
+)
+_ERR_AVATAR_RANGE = _HE(
+    code=_EC.INVALID_ARGUMENT, message="Avatar must be between 0 and 11"
+)
+_ERR_AVATAR_TYPE = _HE(
+    code=_EC.INVALID_ARGUMENT, message="Avatar must be an integer"
+)
+_ERR_GAME_MISSING = _HE(code=_EC.INVALID_ARGUMENT, message="Game data is missing")
+_ERR_PLAYER_NOT_FOUND = _HE(
+    code=_EC.PERMISSION_DENIED, message="Player not found in game"
+)
+_ERR_PLAYER_KICKED = _HE(
+    code=_EC.PERMISSION_DENIED, message="Player has been kicked"
+)
+
+
+# 全ハンドラで共有する遅延初期化のReference
+# （initialize_app後の最初の呼び出しで生成される）
+_ROOT = None
+_GAMES_REF = None
+
+
+def _root():
+    global _ROOT
+    if _ROOT is None:
+        _ROOT = db.reference()
+    return _ROOT
+
+
+def _games_ref():
+    global _GAMES_REF
+    if _GAMES_REF is None:
+        _GAMES_REF = db.reference("games")
+    return _GAMES_REF
+
+
+# phaseのインスタンス内キャッシュ（連続呼び出しでの再読込を省略する）
+# プレイヤー操作はphaseを変更しないため書き込みでの無効化は不要で、
+# start_game/reset_gameによる遷移は短いTTLで吸収する
+_PHASE_CACHE = {}
+_PHASE_CACHE_TTL_MS = 2 * 1000
+_PHASE_CACHE_MAX_ENTRIES = 512
+
+
+def fetch_min_game_context(game_ref, user_id):
+    """
+    ハンドラの検証に必要な最小限のフィールドだけを並列で取得する
+    （ゲーム全体のダウンロードを避ける）
+    phaseの存在でゲームを、playerStateノードでプレイヤーを検証し、
+    (phase, player_state) を返す
+    """
+    current_time = now_ms()
+    cached = _PHASE_CACHE.get(game_ref.key)
+
+    if cached is not None and current_time - cached[0] < _PHASE_CACHE_TTL_MS:
+        phase = cached[1]
+        player_state = (
+            game_ref.child("state").child("playerState").child(user_id).get()
+        )
+    else:
+        phase_future = _EXECUTOR.submit(game_ref.child("state").child("phase").get)
+        player_future = _EXECUTOR.submit(
+            game_ref.child("state").child("playerState").child(user_id).get
+        )
+        phase = phase_future.result()
+        player_state = player_future.result()
+
+        if phase is not None:
+            if len(_PHASE_CACHE) >= _PHASE_CACHE_MAX_ENTRIES:
+                _PHASE_CACHE.clear()
+            _PHASE_CACHE[game_ref.key] = (current_time, phase)
+
+    if phase is None:
+        raise _ERR_GAME_MISSING
+
+    if not player_state:
+        raise _ERR_PLAYER_NOT_FOUND
+
+    error = check_player_structure(player_state)
+    if error:
+        raise https_fn.HttpsError(
+            code=https_fn.FunctionsErrorCode.PERMISSION_DENIED,
+            message=f"Invalid player data structure: {error}",
+        )
+
+    # kickedがnullまたはfalseの場合のみ許可
+    if player_state.get("kicked") is True:
+        raise _ERR_PLAYER_KICKED
+
+    return phase, player_state
+
+
+def _parse_avatar(request_data, current_time):
+    """リクエストのavatar値を検証して整数（またはNoneで削除）に正規化する"""
+    new_avatar = request_data["avatar"]
+    if new_avatar is None:
+        return None
+    try:
+        avatar_int = int(new_avatar)
+    except (ValueError, TypeError):
+        raise _ERR_AVATAR_TYPE
+    if avatar_int < AVATAR_MIN or avatar_int > AVATAR_MAX:
+        raise _ERR_AVATAR_RANGE
+    return avatar_int
+
+
+def _mutate_player_field(
+    req,
+    *,
+    required_field=None,
+    missing_error=_ERR_GAME_ID_REQUIRED,
+    field_path=None,
+    value=None,
+    success_message,
+):
+    """
+    プレイヤー操作ハンドラの共通フロー（認証・引数検証・ゲームと
+    プレイヤーの検証・1回のmulti-path updateでの書き込み）を集約する
+    field_path(phase, user_id)が更新先のゲームルートからの相対パスを、
+    value(request_data, current_time)が書き込む値（Noneで削除）を返す
+    field_pathがNoneの場合はハートビート用の最小経路となり、
+    phaseを読まずプレイヤーノード1件の確認だけを行う
+    """
+    if not req.auth:
+        raise _ERR_AUTH
+    user_id = req.auth.uid
+
+    request_data = req.data or {}
+    if "gameId" not in request_data or (
+        required_field is not None and required_field not in request_data
+    ):
+        raise missing_error
+    game_id = request_data["gameId"]
+
+    game_ref = _games_ref().child(game_id)
+    current_time = now_ms()
+
+    if field_path is None:
+        # 最頻エンドポイントのため最小構成：プレイヤーノード1件の読み取りだけで
+        # 存在確認とkickedチェックを済ませる（phaseは不要）
+        player_state = (
+            game_ref.child("state").child("playerState").child(user_id).get()
+        )
+        if not player_state:
+            raise _ERR_PLAYER_NOT_FOUND
+        if player_state.get("kicked") is True:
+            raise _ERR_PLAYER_KICKED
+        field_updates = {}
+    else:
+        # 書き込む値はRTDBアクセス前に検証しておく（不正入力で読み取りを浪費しない）
+        new_value = value(request_data, current_time)
+        phase, player_state = fetch_min_game_context(game_ref, user_id)
+        field_updates = {field_path(phase, user_id): new_value}
+
+    # フィールド更新・lastConnected・lastUpdatedを1回のmulti-path updateで適用
+    apply_player_mutation(game_id, user_id, current_time, field_updates)
+
+    return {"success": True, "message": success_message}
+
+
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
 def update_name(req: https_fn.CallableRequest) -> dict:
     """
     プレイヤー名を更新する
@@ -29,91 +204,26 @@ def update_name(req: https_fn.CallableRequest) -> dict:
     kicked==Trueの場合やgameIdが存在しない場合はエラー。
     """
     try:
-        # For callable functions, use req.auth.uid directly
-        if not req.auth:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
-                message="Authentication required",
-            )
-
-        user_id = req.auth.uid
-
-        # 新しい名前とgameIdを取得
-        request_data = req.data or {}
-        if "name" not in request_data or "gameId" not in request_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
-                message="Name and gameId are required",
-            )
-
-        new_name = request_data["name"]
-        game_id = request_data["gameId"]
-
-        # ゲームの存在確認
-        db_ref = db.reference()
-        game_ref = db_ref.child("games").child(game_id)
-        game_data = game_ref.get()
-
-        try:
-            validate_game_structure(game_data)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT, message=str(e)
-            )
-
-        # プレイヤーデータ取得とkickedチェック
-        try:
-            get_and_validate_player(game_ref, user_id)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.PERMISSION_DENIED, message=str(e)
-            )
-
-        # Update last connected in players/$playerId
-        update_player_last_connected(user_id)
-
-        # 名前を更新（phaseによって場所が異なる）
-        current_time = int(time.time() * 1000)
-        phase = game_data.get("state", {}).get("phase", 0)
-
-        if phase == 0:
-            # phase == 0: state.config.playerInfo
-            player_info_ref = (
-                game_ref.child("state")
-                .child("config")
-                .child("playerInfo")
-                .child(user_id)
-            )
-        else:
-            # phase != 0: config.playerInfo
-            player_info_ref = (
-                game_ref.child("config").child("playerInfo").child(user_id)
-            )
-
-        player_info_ref.child("name").set(new_name)
-
-        # プレイヤーのlastConnectedを更新
-        player_ref = game_ref.child("state").child("playerState").child(user_id)
-        player_ref.child("lastConnected").set(current_time)
-
-        game_ref.child("lastUpdated").set(current_time)
-
-        return {"success": True, "message": "Name updated successfully"}
+        # playerInfoの場所はphaseに応じてヘルパーが解決する
+        return _mutate_player_field(
+            req,
+            required_field="name",
+            missing_error=_ERR_NAME_REQUIRED,
+            field_path=lambda phase, user_id: f"{player_info_path(user_id, phase)}/name",
+            value=lambda request_data, current_time: request_data["name"],
+            success_message="Name updated successfully",
+        )
 
     except https_fn.HttpsError:
         # Re-raise HttpsError as-is
         raise
-    except ValueError as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.UNAUTHENTICATED, message=str(e)
-        )
     except Exception as e:
         raise https_fn.HttpsError(
             code=https_fn.FunctionsErrorCode.INTERNAL, message="Failed to update name"
         )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
 def update_hint(req: https_fn.CallableRequest) -> dict:
     """
     プレイヤーのヒントを更新する
@@ -123,72 +233,25 @@ def update_hint(req: https_fn.CallableRequest) -> dict:
     kicked==Trueの場合やgameIdが存在しない場合はエラー。
     """
     try:
-        # For callable functions, use req.auth.uid directly
-        if not req.auth:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
-                message="Authentication required",
-            )
-
-        user_id = req.auth.uid
-
-        # 新しいヒントとgameIdを取得
-        request_data = req.data or {}
-        if "hint" not in request_data or "gameId" not in request_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
-                message="Hint and gameId are required",
-            )
-
-        new_hint = request_data["hint"]
-        game_id = request_data["gameId"]
-
-        # ゲームの存在確認
-        db_ref = db.reference()
-        game_ref = db_ref.child("games").child(game_id)
-        game_data = game_ref.get()
-
-        try:
-            validate_game_structure(game_data)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT, message=str(e)
-            )
-
-        # プレイヤーデータ取得とkickedチェック
-        try:
-            get_and_validate_player(game_ref, user_id)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.PERMISSION_DENIED, message=str(e)
-            )
-
-        # Update last connected in players/$playerId
-        update_player_last_connected(user_id)
-
-        # ヒントとlastConnectedを更新
-        current_time = int(time.time() * 1000)
-        player_ref = game_ref.child("state").child("playerState").child(user_id)
-        player_ref.child("hint").set(new_hint)
-        player_ref.child("lastConnected").set(current_time)
-        game_ref.child("lastUpdated").set(current_time)
-
-        return {"success": True, "message": "Hint updated successfully"}
+        return _mutate_player_field(
+            req,
+            required_field="hint",
+            missing_error=_ERR_HINT_REQUIRED,
+            field_path=lambda phase, user_id: f"state/playerState/{user_id}/hint",
+            value=lambda request_data, current_time: request_data["hint"],
+            success_message="Hint updated successfully",
+        )
 
     except https_fn.HttpsError:
         # Re-raise HttpsError as-is
         raise
-    except ValueError as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.UNAUTHENTICATED, message=str(e)
-        )
     except Exception as e:
         raise https_fn.HttpsError(
             code=https_fn.FunctionsErrorCode.INTERNAL, message="Failed to update hint"
         )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
 def update_avatar(req: https_fn.CallableRequest) -> dict:
     """
     プレイヤーのアバターを更新する
@@ -198,107 +261,26 @@ def update_avatar(req: https_fn.CallableRequest) -> dict:
     kicked==Trueの場合やgameIdが存在しない場合はエラー。
     """
     try:
-        # For callable functions, use req.auth.uid directly
-        if not req.auth:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
-                message="Authentication required",
-            )
-
-        user_id = req.auth.uid
-
-        # 新しいアバターとgameIdを取得
-        request_data = req.data or {}
-        if "avatar" not in request_data or "gameId" not in request_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
-                message="Avatar and gameId are required",
-            )
-
-        new_avatar = request_data["avatar"]
-        game_id = request_data["gameId"]
-
-        # アバターの検証
-        if new_avatar is not None:
-            try:
-                avatar_int = int(new_avatar)
-                if avatar_int < AVATAR_MIN or avatar_int > AVATAR_MAX:
-                    raise https_fn.HttpsError(
-                        code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
-                        message="Avatar must be between 0 and 11",
-                    )
-                new_avatar = avatar_int
-            except (ValueError, TypeError):
-                raise https_fn.HttpsError(
-                    code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
-                    message="Avatar must be an integer",
-                )
-
-        # ゲームの存在確認
-        db_ref = db.reference()
-        game_ref = db_ref.child("games").child(game_id)
-        game_data = game_ref.get()
-
-        try:
-            validate_game_structure(game_data)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT, message=str(e)
-            )
-
-        # プレイヤーデータ取得とkickedチェック
-        try:
-            get_and_validate_player(game_ref, user_id)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.PERMISSION_DENIED, message=str(e)
-            )
-
-        # Update last connected in players/$playerId
-        update_player_last_connected(user_id)
-
-        # アバターを更新（phaseによって場所が異なる）
-        current_time = int(time.time() * 1000)
-        phase = game_data.get("state", {}).get("phase", 0)
-
-        if phase == 0:
-            # phase == 0: state.config.playerInfo
-            player_info_ref = (
-                game_ref.child("state")
-                .child("config")
-                .child("playerInfo")
-                .child(user_id)
-            )
-        else:
-            # phase != 0: config.playerInfo
-            player_info_ref = (
-                game_ref.child("config").child("playerInfo").child(user_id)
-            )
-
-        player_info_ref.child("avatar").set(new_avatar)
-
-        # プレイヤーのlastConnectedを更新
-        player_ref = game_ref.child("state").child("playerState").child(user_id)
-        player_ref.child("lastConnected").set(current_time)
-
-        game_ref.child("lastUpdated").set(current_time)
-
-        return {"success": True, "message": "Avatar updated successfully"}
+        # playerInfoの場所はphaseに応じてヘルパーが解決する
+        return _mutate_player_field(
+            req,
+            required_field="avatar",
+            missing_error=_ERR_AVATAR_REQUIRED,
+            field_path=lambda phase, user_id: f"{player_info_path(user_id, phase)}/avatar",
+            value=_parse_avatar,
+            success_message="Avatar updated successfully",
+        )
 
     except https_fn.HttpsError:
         # Re-raise HttpsError as-is
         raise
-    except ValueError as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.UNAUTHENTICATED, message=str(e)
-        )
     except Exception as e:
         raise https_fn.HttpsError(
             code=https_fn.FunctionsErrorCode.INTERNAL, message="Failed to update avatar"
         )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
 def submit(req: https_fn.CallableRequest) -> dict:
     """
     プレイヤーの提出時間を記録する
@@ -308,64 +290,16 @@ def submit(req: https_fn.CallableRequest) -> dict:
     kicked==Trueの場合やgameIdが存在しない場合はエラー。
     """
     try:
-        # For callable functions, use req.auth.uid directly
-        if not req.auth:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
-                message="Authentication required",
-            )
-
-        user_id = req.auth.uid
-
-        # gameIdを取得
-        request_data = req.data or {}
-        if "gameId" not in request_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
-                message="gameId is required",
-            )
-
-        game_id = request_data["gameId"]
-
-        # ゲームの存在確認
-        db_ref = db.reference()
-        game_ref = db_ref.child("games").child(game_id)
-        game_data = game_ref.get()
-
-        try:
-            validate_game_structure(game_data)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT, message=str(e)
-            )
-
-        # プレイヤーデータ取得とkickedチェック
-        try:
-            get_and_validate_player(game_ref, user_id)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.PERMISSION_DENIED, message=str(e)
-            )
-
-        # Update last connected in players/$playerId
-        update_player_last_connected(user_id)
-
-        # 提出時間とlastConnectedを記録
-        current_time = int(time.time() * 1000)
-        player_ref = game_ref.child("state").child("playerState").child(user_id)
-        player_ref.child("submitted").set(current_time)
-        player_ref.child("lastConnected").set(current_time)
-        game_ref.child("lastUpdated").set(current_time)
-
-        return {"success": True, "message": "Submit time recorded successfully"}
+        return _mutate_player_field(
+            req,
+            field_path=lambda phase, user_id: f"state/playerState/{user_id}/submitted",
+            value=lambda request_data, current_time: current_time,
+            success_message="Submit time recorded successfully",
+        )
 
     except https_fn.HttpsError:
         # Re-raise HttpsError as-is
         raise
-    except ValueError as e:
-        raise https_fn.HttpsError(
-            code=https_fn.FunctionsErrorCode.UNAUTHENTICATED, message=str(e)
-        )
     except Exception as e:
         raise https_fn.HttpsError(
             code=https_fn.FunctionsErrorCode.INTERNAL,
@@ -373,7 +307,7 @@ def submit(req: https_fn.CallableRequest) -> dict:
         )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
 def withdraw(req: https_fn.CallableRequest) -> dict:
     """
     プレイヤーの提出を取り消す
@@ -383,56 +317,13 @@ def withdraw(req: https_fn.CallableRequest) -> dict:
     kicked==Trueの場合やgameIdが存在しない場合はエラー。
     """
     try:
-        # For callable functions, use req.auth.uid directly
-        if not req.auth:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
-                message="Authentication required",
-            )
-
-        user_id = req.auth.uid
-
-        # gameIdを取得
-        request_data = req.data or {}
-        if "gameId" not in request_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
-                message="gameId is required",
-            )
-
-        game_id = request_data["gameId"]
-
-        # ゲームの存在確認
-        db_ref = db.reference()
-        game_ref = db_ref.child("games").child(game_id)
-        game_data = game_ref.get()
-
-        try:
-            validate_game_structure(game_data)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT, message=str(e)
-            )
-
-        # プレイヤーデータ取得とkickedチェック
-        try:
-            get_and_validate_player(game_ref, user_id)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.PERMISSION_DENIED, message=str(e)
-            )
-
-        # Update last connected in players/$playerId
-        update_player_last_connected(user_id)
-
-        # 提出を取り消し（submittedを削除）とlastConnectedを更新
-        current_time = int(time.time() * 1000)
-        player_ref = game_ref.child("state").child("playerState").child(user_id)
-        player_ref.child("submitted").delete()
-        player_ref.child("lastConnected").set(current_time)
-        game_ref.child("lastUpdated").set(current_time)
-
-        return {"success": True, "message": "Submit withdrawn successfully"}
+        # None書き込みで削除される
+        return _mutate_player_field(
+            req,
+            field_path=lambda phase, user_id: f"state/playerState/{user_id}/submitted",
+            value=lambda request_data, current_time: None,
+            success_message="Submit withdrawn successfully",
+        )
 
     except https_fn.HttpsError:
         # Re-raise HttpsError as-is
@@ -444,7 +335,7 @@ def withdraw(req: https_fn.CallableRequest) -> dict:
         )
 
 
-@https_fn.on_call(enforce_app_check=not is_emulator())
+@https_fn.on_call(enforce_app_check=ENFORCE_APP_CHECK)
 def heartbeat(req: https_fn.CallableRequest) -> dict:
     """
     プレイヤーのハートビート（接続確認）
@@ -453,59 +344,10 @@ def heartbeat(req: https_fn.CallableRequest) -> dict:
     kicked==Trueの場合やgameIdが存在しない場合はエラー。
     """
     try:
-        # For callable functions, use req.auth.uid directly
-        if not req.auth:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
-                message="Authentication required",
-            )
-
-        user_id = req.auth.uid
-
-        # gameIdを取得
-        request_data = req.data or {}
-        if "gameId" not in request_data:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
-                message="gameId is required",
-            )
-
-        game_id = request_data["gameId"]
-
-        # ゲームの存在確認
-        db_ref = db.reference()
-        game_ref = db_ref.child("games").child(game_id)
-        game_data = game_ref.get()
-
-        try:
-            validate_game_structure(game_data)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT, message=str(e)
-            )
-
-        # プレイヤーデータ取得とkickedチェック
-        try:
-            get_and_validate_player(game_ref, user_id)
-        except ValueError as e:
-            raise https_fn.HttpsError(
-                code=https_fn.FunctionsErrorCode.PERMISSION_DENIED, message=str(e)
-            )
-
-        # Update last connected in players/$playerId
-        update_player_last_connected(user_id)
-
-        # lastConnectedとgameのlastUpdatedを更新
-        current_time = int(time.time() * 1000)
-
-        # プレイヤーのlastConnectedを更新
-        player_ref = game_ref.child("state").child("playerState").child(user_id)
-        player_ref.child("lastConnected").set(current_time)
-
-        # ゲームのlastUpdatedを更新
-        game_ref.child("lastUpdated").set(current_time)
-
-        return {"success": True, "message": "Heartbeat updated successfully"}
+        return _mutate_player_field(
+            req,
+            success_message="Heartbeat updated successfully",
+        )
 
     except https_fn.HttpsError:
         # Re-raise HttpsError as-is
@@ -1,6 +1,9 @@
 # Common utility functions for the card game application
 
 from firebase_admin import db, auth
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import os
 import time
 
 # Constants
@@ -10,6 +13,10 @@ CREATION_RATE_LIMIT_WINDOW_MS = 60 * 1000
 CREATION_RATE_LIMIT_THRESHOLD = 30  # Maximum game creations per rate limit window
 AVATAR_MIN = 0  # Minimum avatar ID (inclusive)
 AVATAR_MAX = 11  # Maximum avatar ID (inclusive)
+
+# 有効なアバターID集合 {0..11} を表すビットマスク
+# （(1 << avatar) & _AVATAR_MASK が非ゼロなら有効）
+_AVATAR_MASK = (1 << (AVATAR_MAX + 1)) - 1
 PASSWORD_MIN = 0  # Minimum password value (4 digits, 0000 allowed)
 PASSWORD_MAX = 9999  # Maximum password value (4 digits, 9999 allowed)
 PASSWORD_LENGTH = 4  # Password length in digits (used for validation)
@@ -21,61 +28,202 @@ VALUE_MAX = 100  # Maximum value for game values (inclusive)
 MAX_PLAYERS = 12  # Maximum players per game (room capacity)
 ACCOUNT_COOLDOWN_MS = 4 * 1000  # New account cooldown in milliseconds (4 seconds)
 
+# RTDBのサーバー側タイムスタンプセンチネル（書き込み時にサーバーが現在時刻を埋める）
+SERVER_TIMESTAMP = {".sv": "timestamp"}
+
+# 独立したRTDBリードを並列化するための共有スレッドプール
+_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+
+# 「キー欠落」と「値がNone」を1回のdict参照で区別するためのセンチネル
+_MISSING = object()
+
+
+def is_emulator():
+    """
+    エミュレーター環境で実行中かどうかを返す
+    """
+    return os.getenv("FUNCTIONS_EMULATOR") == "true"
+
+
+# エミュレーター判定・App Checkの強制可否はデプロイ時に決まるため、
+# 読み込み時に1回だけ判定する
+_IS_EMULATOR = is_emulator()
+ENFORCE_APP_CHECK = not _IS_EMULATOR
+
+
+def now_ms() -> int:
+    """
+    現在時刻をミリ秒（millisecondsSinceEpoch）で返す
+    time_ns()は整数を直接返すため、floatの乗算・丸めを経由しない
+    """
+    return time.time_ns() // 1_000_000
+
+
+# 検証済みIDトークンのインスタンス内キャッシュ
+# キーはトークンのblake2bハッシュ（生のJWTは保持しない）、値は(uid, exp秒)
+_TOKEN_CACHE = {}
+_TOKEN_CACHE_MAX_ENTRIES = 10_000
+
+# トークン有効期限のマージン（期限切れ間際はキャッシュを信用しない）
+_TOKEN_EXP_SKEW_S = 30
+
 
 def verify_auth(req):
     """
     Firebase Authenticationトークンを検証する
+    検証済みトークンはインスタンス内にキャッシュし、有効期限の30秒前までは
+    署名の再検証（RSA検証・公開鍵フェッチ）を省略する
     """
-    import os
-
-    # エミュレーター環境の場合、デバッグ用のユーザーIDを使用
-    # if os.getenv("FUNCTIONS_EMULATOR") == "true":
-    #     # エミュレーター環境では、テスト用のユーザーIDを返す
-    #     return "test_user_id"
+    # エミュレーター環境では、テスト用のユーザーIDを返す
+    if _IS_EMULATOR:
+        return "test_user_id"
 
     auth_header = req.headers.get("Authorization")
     if not auth_header or not auth_header.startswith("Bearer "):
         raise ValueError("Authorization header is missing or invalid")
 
     token = auth_header.split(" ")[1]
+
+    token_key = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    cached = _TOKEN_CACHE.get(token_key)
+    if cached is not None:
+        uid, exp = cached
+        if time.time() < exp - _TOKEN_EXP_SKEW_S:
+            return uid
+        del _TOKEN_CACHE[token_key]
+
     try:
         decoded_token = auth.verify_id_token(token)
-        return decoded_token["uid"]
     except Exception as e:
-        raise ValueError(f"Invalid token: {str(e)}")
+        raise ValueError("Invalid token") from e
+
+    if len(_TOKEN_CACHE) >= _TOKEN_CACHE_MAX_ENTRIES:
+        _TOKEN_CACHE.clear()
+    _TOKEN_CACHE[token_key] = (decoded_token["uid"], decoded_token["exp"])
+    return decoded_token["uid"]
 
 
-def verify_game_admin(user_id: str, game_id: str):
+def _assert_phase_and_playerinfo(game_data):
     """
-    ユーザーがゲームの管理者（最初に参加したプレイヤー）かどうかを確認する
+    管理者判定に必要な最小限の構造（state.phaseと対応するplayerInfo）だけを
+    確認し、(phase, player_info)を返す（欠けている場合はValueError）
+    フルスキーマ検証は構造を変更するエンドポイント側の責務とし、
+    このパスでは実行しない
     """
-    db_ref = db.reference()
-    game_ref = db_ref.child("games").child(game_id)
-    game_data = game_ref.get()
-
-    validate_game_structure(game_data)
+    state = (game_data or {}).get("state")
+    phase = state.get("phase") if state else None
+    if phase is None:
+        raise ValueError("Game data is missing")
 
-    # playerInfoを取得し、値が一番小さいプレイヤーを特定（phaseによって場所が異なる）
-    phase = game_data["state"]["phase"]
+    # playerInfoの場所はphaseによって異なる
     if phase == 0:
-        player_info = game_data["state"]["config"]["playerInfo"]
+        player_info = (state.get("config") or {}).get("playerInfo")
+    else:
+        player_info = (game_data.get("config") or {}).get("playerInfo")
+
+    if not player_info:
+        raise ValueError("Game data is missing")
+
+    return phase, player_info
+
+
+def verify_game_admin(user_id: str, game_id: str, game_data=None):
+    """
+    ユーザーがゲームの管理者（最初に参加したプレイヤー）かどうかを確認する
+    game_dataが渡された場合は再取得・再検証せず、そのスナップショットで判定する
+    （呼び出し元が構造検証済みであることが前提）
+    スナップショットがない場合は判定に必要なphaseとplayerInfoだけを
+    限定リードで取得する（ゲーム全体のダウンロードを避ける）
+    """
+    if game_data is not None:
+        phase, player_info = _assert_phase_and_playerinfo(game_data)
     else:
-        player_info = game_data["config"]["playerInfo"]
+        game_ref = db.reference("games").child(game_id)
+        matching_ref = game_ref.child("state").child("config").child("playerInfo")
+        playing_ref = game_ref.child("config").child("playerInfo")
+
+        # playerInfoの場所はphaseに依存するが、スキーマ上存在するのは常に一方
+        # だけなので、phaseと両候補を投機的に並列取得して1往復の待ちにまとめる
+        # entranceのインデックスを利用し、最小entranceの1件だけを
+        # サーバー側で選んで返してもらう（全playerInfoの転送とPython側のminを省く）
+        phase_future = _EXECUTOR.submit(game_ref.child("state").child("phase").get)
+        matching_future = _EXECUTOR.submit(
+            matching_ref.order_by_child("entrance").limit_to_first(1).get
+        )
+        playing_future = _EXECUTOR.submit(
+            playing_ref.order_by_child("entrance").limit_to_first(1).get
+        )
 
-    # 最小値のplayerIdを取得（entranceフィールドを使用）
-    min_player_id = min(player_info, key=lambda k: player_info[k]["entrance"])
-    if user_id != min_player_id:
+        phase = phase_future.result()
+        if phase is None:
+            raise ValueError("Game data is missing")
+
+        if phase == 0:
+            admin_future, player_info_ref = matching_future, matching_ref
+        else:
+            admin_future, player_info_ref = playing_future, playing_ref
+
+        try:
+            admin_entry = admin_future.result()
+        except Exception:
+            # インデックス未定義の環境ではクエリが失敗するため、
+            # 従来どおりの全件取得＋Python側スキャンにフォールバックする
+            admin_entry = None
+
+        if admin_entry:
+            # 返るのは最小entranceの1件のみ：キー一致だけで管理者判定できる
+            if user_id not in admin_entry:
+                raise ValueError(
+                    "Only the earliest joined player can perform this action"
+                )
+            return True
+
+        player_info = player_info_ref.get()
+        if not player_info:
+            raise ValueError("Game data is missing")
+
+    # 呼び出し元より小さいentranceが1つでもあれば管理者ではない（単一パスで早期終了）
+    caller_info = player_info.get(user_id)
+    if caller_info is None:
         raise ValueError("Only the earliest joined player can perform this action")
 
+    caller_entrance = caller_info["entrance"]
+    for info in player_info.values():
+        if info["entrance"] < caller_entrance:
+            raise ValueError(
+                "Only the earliest joined player can perform this action"
+            )
+
     return True
 
 
-def validate_game_structure(game_data):
+def _check_player_info_map(player_info, where: str):
     """
-    ゲームの構造を検証する
+    playerInfoマップ全体（要素数と各エントリの構造）を検証し、
+    エラーメッセージまたはNoneを返す
+    whereはエラーメッセージに使う場所の表記
+    """
+    if not player_info or not isinstance(player_info, dict) or len(player_info) == 0:
+        return f"{where} must have at least one element"
+    if len(player_info) > MAX_PLAYERS:
+        return f"{where} cannot have more than {MAX_PLAYERS} elements"
+
+    # 各プレイヤー情報の構造検証
+    for player_id, player_info_data in player_info.items():
+        error = check_player_info_structure(player_info_data)
+        if error:
+            return f"Invalid player info for {player_id}: {error}"
+
+    return None
+
+
+def check_game_structure(game_data):
+    """
+    ゲームの構造を検証し、エラーメッセージまたはNoneを返す
+    （ホットパスで例外のraise/catchを避けるための戻り値版）
     """
     if not game_data:
-        raise ValueError("Game data is missing")
+        return "Game data is missing"
 
     # config の検証（phase によって必須性が変わる）
     config = game_data.get("config")
@@ -83,181 +231,188 @@ def validate_game_structure(game_data):
     # state の検証（phase を先に取得するため）
     state = game_data.get("state")
     if not state:
-        raise ValueError("state is missing")
+        return ("state is missing")
 
     # state.phase の検証
     phase = state.get("phase")
     if phase is None:
-        raise ValueError("state.phase is required")
+        return ("state.phase is required")
+
+    # 繰り返し参照するサブツリーは一度だけ取得してローカルに束縛する
+    state_config = state.get("config")
 
     # config と state.config の相互排他性を検証
     if phase == 0:
         # phase == 0: config は none であるべき
         if config is not None:
-            raise ValueError("config should be None when phase == 0")
+            return ("config should be None when phase == 0")
     else:
         # phase != 0: config は必須
         if not config:
-            raise ValueError("config is missing when phase != 0")
+            return ("config is missing when phase != 0")
         # state.config は none であるべき
-        if state.get("config") is not None:
-            raise ValueError("state.config should be None when phase != 0")
+        if state_config is not None:
+            return ("state.config should be None when phase != 0")
 
     # password の検証
     password = game_data.get("password")
     if password is None or password == "":
-        raise ValueError("password is required")
+        return ("password is required")
 
     # values の検証（phase によって要否が変わる）
     values = game_data.get("values")
     if phase == 0:
         # phase == 0: values は none であるべき
         if values is not None:
-            raise ValueError("values should be None when phase == 0")
+            return ("values should be None when phase == 0")
     else:
         # phase != 0: values は必須
         if not values:
-            raise ValueError("values is required when phase != 0")
+            return ("values is required when phase != 0")
 
     # topic の検証（phaseによって場所が異なる）
     if phase == 0:
         # phase == 0: state.config.topic (optional per schema)
-        state_config = state.get("config")
         if not state_config:
-            raise ValueError("state.config is missing")
+            return ("state.config is missing")
         # topic is optional when phase == 0, no validation needed
     else:
         # phase != 0: config.topic (required per schema)
         if config:
             topic = config.get("topic")
             if topic is None:
-                raise ValueError("config.topic is required")
+                return ("config.topic is required")
 
     # playerInfo の検証（phaseによって場所が異なる）
     if phase == 0:
-        # phase == 0: state.config.playerInfo
-        state_config = state.get("config")
-        if not state_config:
-            raise ValueError("state.config is missing")
-        player_info = state_config.get("playerInfo")
-        if (
-            not player_info
-            or not isinstance(player_info, dict)
-            or len(player_info) == 0
-        ):
-            raise ValueError("state.config.playerInfo must have at least one element")
-        if len(player_info) > MAX_PLAYERS:
-            raise ValueError(
-                f"state.config.playerInfo cannot have more than {MAX_PLAYERS} elements"
-            )
-
-        # 各プレイヤー情報の構造検証
-        for player_id, player_info_data in player_info.items():
-            try:
-                validate_player_info_structure(player_info_data)
-            except ValueError as e:
-                raise ValueError(f"Invalid player info for {player_id}: {str(e)}")
-    else:
+        # phase == 0: state.config.playerInfo（存在はtopicの検証で確認済み）
+        error = _check_player_info_map(
+            state_config.get("playerInfo"), "state.config.playerInfo"
+        )
+        if error:
+            return error
+    elif config:
         # phase != 0: config.playerInfo
-        if config:
-            player_info = config.get("playerInfo")
-            if (
-                not player_info
-                or not isinstance(player_info, dict)
-                or len(player_info) == 0
-            ):
-                raise ValueError("config.playerInfo must have at least one element")
-            if len(player_info) > MAX_PLAYERS:
-                raise ValueError(
-                    f"config.playerInfo cannot have more than {MAX_PLAYERS} elements"
-                )
-
-            # 各プレイヤー情報の構造検証
-            for player_id, player_info_data in player_info.items():
-                try:
-                    validate_player_info_structure(player_info_data)
-                except ValueError as e:
-                    raise ValueError(f"Invalid player info for {player_id}: {str(e)}")
+        error = _check_player_info_map(
+            config.get("playerInfo"), "config.playerInfo"
+        )
+        if error:
+            return error
 
     # state.playerState の検証（最低1つ、最大MAX_PLAYERS要素が必要）
     players = state.get("playerState")
     if not players or not isinstance(players, dict) or len(players) == 0:
-        raise ValueError("state.playerState must have at least one element")
+        return ("state.playerState must have at least one element")
     if len(players) > MAX_PLAYERS:
-        raise ValueError(
+        return (
             f"state.playerState cannot have more than {MAX_PLAYERS} elements"
         )
 
     # 各プレイヤーデータの構造検証
     for player_id, player_data in players.items():
-        try:
-            validate_player_structure(player_data)
-        except ValueError as e:
-            raise ValueError(f"Invalid player data for {player_id}: {str(e)}")
+        error = check_player_structure(player_data)
+        if error:
+            return f"Invalid player data for {player_id}: {error}"
 
+    return None
+
+
+def validate_game_structure(game_data):
+    """
+    ゲームの構造を検証する（不正な場合はValueError）
+    """
+    error = check_game_structure(game_data)
+    if error:
+        raise ValueError(error)
     return True
 
 
-def validate_player_structure(player_data):
+def check_player_structure(player_data):
     """
-    プレイヤーの構造を検証する（新スキーマ）
+    プレイヤーの構造を検証し、エラーメッセージまたはNoneを返す（新スキーマ）
     hint: String必須（空文字OK、nullもOK）
     lastConnected: 必須
     submitted, kicked: オプショナル
     """
     if not isinstance(player_data, dict):
-        raise ValueError("Player data must be a dictionary")
+        return "Player data must be a dictionary"
 
     # hint: 必須、String、空文字OK、nullもOK
-    if "hint" not in player_data:
-        raise ValueError("Player hint field is required")
-    if player_data["hint"] is not None and not isinstance(player_data["hint"], str):
-        raise ValueError("Player hint must be a string or null")
+    hint = player_data.get("hint", _MISSING)
+    if hint is _MISSING:
+        return "Player hint field is required"
+    if hint is not None and not isinstance(hint, str):
+        return "Player hint must be a string or null"
 
     # lastConnected: 必須
     if "lastConnected" not in player_data:
-        raise ValueError("Player lastConnected is required")
+        return "Player lastConnected is required"
+
+    return None
 
+
+def validate_player_structure(player_data):
+    """
+    プレイヤーの構造を検証する（不正な場合はValueError）
+    """
+    error = check_player_structure(player_data)
+    if error:
+        raise ValueError(error)
     return True
 
 
-def validate_player_info_structure(player_info_data):
+def check_player_info_structure(player_info_data):
     """
-    プレイヤー情報の構造を検証する（新スキーマ）
+    プレイヤー情報の構造を検証し、エラーメッセージまたはNoneを返す（新スキーマ）
     name: String必須（空文字OK）
     avatar: 必須、MIN以上MAX以下
     entrance: 必須
     """
     if not isinstance(player_info_data, dict):
-        raise ValueError("Player info data must be a dictionary")
+        return "Player info data must be a dictionary"
 
     # name: 必須、String、空文字OK
-    if "name" not in player_info_data:
-        raise ValueError("Player name field is required")
-    if not isinstance(player_info_data["name"], str):
-        raise ValueError("Player name must be a string")
+    name = player_info_data.get("name", _MISSING)
+    if name is _MISSING:
+        return "Player name field is required"
+    if not isinstance(name, str):
+        return "Player name must be a string"
 
     # avatar: 必須、MIN以上MAX以下
-    if "avatar" not in player_info_data:
-        raise ValueError("Player avatar is required")
-    avatar = player_info_data["avatar"]
-    if not isinstance(avatar, int) or avatar < AVATAR_MIN or avatar > AVATAR_MAX:
-        raise ValueError(f"Player avatar must be between {AVATAR_MIN} and {AVATAR_MAX}")
+    # 1ビットシフトとマスクで型チェックと範囲チェックを同時に行う
+    # （非整数はTypeError、負数はValueError、範囲外はマスクで0になる）
+    avatar = player_info_data.get("avatar", _MISSING)
+    if avatar is _MISSING:
+        return "Player avatar is required"
+    try:
+        valid = (1 << avatar) & _AVATAR_MASK
+    except (TypeError, ValueError):
+        valid = 0
+    if not valid:
+        return f"Player avatar must be between {AVATAR_MIN} and {AVATAR_MAX}"
 
     # entrance: 必須
     if "entrance" not in player_info_data:
-        raise ValueError("Player entrance is required")
+        return "Player entrance is required"
 
+    return None
+
+
+def validate_player_info_structure(player_info_data):
+    """
+    プレイヤー情報の構造を検証する（不正な場合はValueError）
+    """
+    error = check_player_info_structure(player_info_data)
+    if error:
+        raise ValueError(error)
     return True
 
 
-def get_and_validate_player(game_ref, user_id):
+def get_and_validate_player(game_ref, user_id: str):
     """
     プレイヤーデータを取得し、存在確認とkickedチェックを行う
     kickedがnullまたはfalseの場合のみ成功
     """
-    from firebase_admin import db
-
     player_ref = game_ref.child("state").child("playerState").child(user_id)
     player_data = player_ref.get()
 
@@ -265,10 +420,9 @@ def get_and_validate_player(game_ref, user_id):
         raise ValueError("Player not found in game")
 
     # プレイヤーデータ構造の検証
-    try:
-        validate_player_structure(player_data)
-    except ValueError as e:
-        raise ValueError(f"Invalid player data structure: {str(e)}")
+    error = check_player_structure(player_data)
+    if error:
+        raise ValueError(f"Invalid player data structure: {error}")
 
     # kickedがnullまたはfalseの場合のみ許可
     kicked = player_data.get("kicked")
@@ -278,56 +432,225 @@ def get_and_validate_player(game_ref, user_id):
     return player_data
 
 
-def validate_game_phase(game_data, required_phase):
+def check_game_phase(game_data, required_phase: int):
     """
-    ゲームのフェーズが要求されたフェーズと一致するかを厳密にチェックする
+    ゲームのフェーズが要求フェーズと一致するかを検証し、
+    エラーメッセージまたはNoneを返す
     """
     if not game_data:
-        raise ValueError("Game data is missing")
+        return "Game data is missing"
 
     if "state" not in game_data:
-        raise ValueError("Invalid game data: missing state")
+        return "Invalid game data: missing state"
 
     current_phase = game_data["state"].get("phase")
     if current_phase is None:
-        raise ValueError("Invalid game data: missing phase")
+        return "Invalid game data: missing phase"
 
     if current_phase != required_phase:
-        raise ValueError(
-            f"Invalid game phase: expected {required_phase}, got {current_phase}"
-        )
+        return f"Invalid game phase: expected {required_phase}, got {current_phase}"
+
+    return None
 
+
+def validate_game_phase(game_data, required_phase: int):
+    """
+    ゲームのフェーズが要求されたフェーズと一致するかを厳密にチェックする
+    （不正な場合はValueError）
+    """
+    error = check_game_phase(game_data, required_phase)
+    if error:
+        raise ValueError(error)
     return True
 
 
+# アカウント作成時刻のインスタンス内キャッシュ（作成時刻は不変）
+# クールダウンを一度通過したuidはセンチネル0で記録し、
+# 以後のチェックを辞書参照1回＋減算だけにする
+_CREATION_TS_CACHE = {}
+_CREATION_TS_CACHE_MAX_ENTRIES = 50_000
+_PAST_COOLDOWN = 0
+
+
 def verify_account_age(user_id: str):
     """
     新規作成されたアカウントの4秒間クールダウンをチェックする
     アカウント作成から4秒以内の場合は例外を発生させる
+    作成時刻は不変なのでインスタンス内にキャッシュし、
+    クールダウン通過後はFirebase Authへの問い合わせを省略する
     """
-    try:
-        user_record = auth.get_user(user_id)
-        current_time = int(time.time() * 1000)  # Current time in milliseconds
+    current_time = now_ms()
+
+    creation_time = _CREATION_TS_CACHE.get(user_id)
+    if creation_time is None:
+        try:
+            user_record = auth.get_user(user_id)
+        except auth.UserNotFoundError:
+            raise ValueError("User account not found")
 
         # アカウント作成時刻を取得
         creation_time = user_record.user_metadata.creation_timestamp
+        if len(_CREATION_TS_CACHE) >= _CREATION_TS_CACHE_MAX_ENTRIES:
+            _CREATION_TS_CACHE.clear()
+        _CREATION_TS_CACHE[user_id] = creation_time
+
+    # 4秒間のクールダウンチェック
+    if current_time - creation_time < ACCOUNT_COOLDOWN_MS:
+        raise ValueError(
+            "Account is too new. Please wait a few seconds before using the app."
+        )
+
+    # 通過済みのアカウントは以後auth.get_userを呼ばない
+    _CREATION_TS_CACHE[user_id] = _PAST_COOLDOWN
 
-        # 4秒間のクールダウンチェック
-        if current_time - creation_time < ACCOUNT_COOLDOWN_MS:
-            raise ValueError(
-                "Account is too new. Please wait a few seconds before using the app."
-            )
 
-    except auth.UserNotFoundError:
-        raise ValueError("User account not found")
+class TokenBucket:
+    """
+    インスタンス内のトークンバケット（経過時間に比例して容量まで補充、O(1)判定）
+    RTDB側のレート制限トランザクションと同じ補充則を使う
+    """
+
+    __slots__ = ("tokens", "last_refill", "capacity", "refill_rate")
+
+    def __init__(self, capacity: int, refill_rate: float, current_time: int):
+        self.tokens = capacity
+        self.last_refill = current_time
+        self.capacity = capacity
+        self.refill_rate = refill_rate  # トークン/ミリ秒
+
+    def take(self, current_time: int, cost: int = 1):
+        """トークンを補充したうえでcost分を消費できればTrueを返す"""
+        self.tokens = min(
+            self.capacity,
+            self.tokens + (current_time - self.last_refill) * self.refill_rate,
+        )
+        self.last_refill = current_time
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+
+# ゲーム作成レート制限の事前チェック用バケット（uid -> TokenBucket）
+_CREATION_BUCKETS = {}
+_CREATION_BUCKETS_MAX_ENTRIES = 10_000
+_CREATION_REFILL_RATE = CREATION_RATE_LIMIT_THRESHOLD / CREATION_RATE_LIMIT_WINDOW_MS
+
+
+def check_creation_rate_limit(user_id: str, current_time: int) -> bool:
+    """
+    ゲーム作成レート制限のインスタンス内事前チェック
+    権威はplayers/{uid}/rateへのトランザクション側にあり、ここでは
+    同一インスタンスからの明らかな超過をRTDBに触れる前に弾くだけ
+    """
+    bucket = _CREATION_BUCKETS.get(user_id)
+    if bucket is None:
+        if len(_CREATION_BUCKETS) >= _CREATION_BUCKETS_MAX_ENTRIES:
+            _CREATION_BUCKETS.clear()
+        bucket = _CREATION_BUCKETS[user_id] = TokenBucket(
+            CREATION_RATE_LIMIT_THRESHOLD, _CREATION_REFILL_RATE, current_time
+        )
+    return bucket.take(current_time)
+
+
+# インスタンス内でのlastConnected書き込み時刻（スロットリング用）
+_LAST_CONNECTED_WRITTEN_AT = {}
+
+# スロットリングで見送られた書き込みの保留分（uid -> タイムスタンプ）
+# 次にRTDBへ書き込む機会があるとき、同じ1回のupdateに相乗りして反映される
+_PENDING_LAST_CONNECTED = {}
+
+# ポーリング系エンドポイントでのlastConnected書き込み間隔（15秒）
+LAST_CONNECTED_THROTTLE_MS = 15 * 1000
+
+
+def add_player_last_connected(updates: dict, user_id: str, current_time: int):
+    """
+    multi-path update用の辞書にplayers/{uid}/lastConnectedの書き込みを追加する
+    保留中の他プレイヤーの分もまとめて同じupdateに載せる
+    （単独書き込み版のupdate_player_last_connectedとスロットリング記録を共有）
+    """
+    _PENDING_LAST_CONNECTED[user_id] = current_time
+    for uid, ts in _PENDING_LAST_CONNECTED.items():
+        updates[f"players/{uid}/lastConnected"] = ts
+        _LAST_CONNECTED_WRITTEN_AT[uid] = ts
+    _PENDING_LAST_CONNECTED.clear()
+
+
+def _drain_pending_last_connected(updates: dict, user_id: str, current_time: int):
+    """
+    呼び出し元と保留中プレイヤーのlastConnected書き込みを
+    updates（playersルート相対のmulti-path update用辞書）に展開する
+    """
+    _PENDING_LAST_CONNECTED[user_id] = current_time
+    for uid, ts in _PENDING_LAST_CONNECTED.items():
+        updates[f"{uid}/lastConnected"] = ts
+        _LAST_CONNECTED_WRITTEN_AT[uid] = ts
+    _PENDING_LAST_CONNECTED.clear()
+
+
+def touch_player(user_id: str, **fields):
+    """
+    players/{uid}配下の兄弟フィールドとlastConnectedを
+    1回のmulti-path updateでまとめて書き込む
+    個別の.set()を並べるとフィールド数分のRTDB往復が発生するため、
+    同時に変更するフィールドはこのヘルパーで束ねること
+    保留中の他プレイヤーのlastConnectedも同じupdateに相乗りする
+    """
+    current_time = now_ms()
+    updates = {f"{user_id}/{field}": value for field, value in fields.items()}
+    _drain_pending_last_connected(updates, user_id, current_time)
+    db.reference("players").update(updates)
 
 
-def update_player_last_connected(user_id: str):
+def player_info_path(user_id: str, phase: int) -> str:
+    """
+    playerInfoエントリへのゲームルートからの相対パスを返す
+    （phase == 0ではstate/config配下、それ以外ではconfig配下）
+    """
+    if phase == 0:
+        return f"state/config/playerInfo/{user_id}"
+    return f"config/playerInfo/{user_id}"
+
+
+def apply_player_mutation(
+    game_id: str, user_id: str, current_time: int, field_updates: dict
+):
+    """
+    プレイヤー操作の共通書き込み（playerStateのlastConnected・ゲームのlastUpdated・
+    players/{uid}/lastConnected）とハンドラ固有のフィールド更新を
+    1回のmulti-path updateにまとめて適用する
+    field_updatesのキーはゲームルートからの相対パス
+    """
+    updates = {
+        f"games/{game_id}/{path}": value for path, value in field_updates.items()
+    }
+    updates[f"games/{game_id}/state/playerState/{user_id}/lastConnected"] = current_time
+    updates[f"games/{game_id}/lastUpdated"] = current_time
+    add_player_last_connected(updates, user_id, current_time)
+    db.reference().update(updates)
+
+
+def update_player_last_connected(
+    user_id: str, throttle_ms: int = 0, current_time: int = None
+):
     """
     プレイヤーのlastConnectedを現在時刻で更新する
     players/$playerId/lastConnectedフィールドを更新
+    throttle_msを指定すると、同一インスタンスからの直近の書き込みが
+    その間隔内であれば即時の書き込みを見送り、保留分として記録する
+    （保留分は次の書き込み機会にまとめて反映される）
+    呼び出し元が既に現在時刻を計算済みの場合はcurrent_timeで渡せる
     """
-    current_time = int(time.time() * 1000)  # Current time in milliseconds
-    db_ref = db.reference()
-    player_ref = db_ref.child("players").child(user_id)
-    player_ref.child("lastConnected").set(current_time)
+    if current_time is None:
+        current_time = now_ms()
+    _PENDING_LAST_CONNECTED[user_id] = current_time
+    if throttle_ms:
+        last_written = _LAST_CONNECTED_WRITTEN_AT.get(user_id, 0)
+        if current_time - last_written < throttle_ms:
+            return
+
+    # 保留分をすべて1回のmulti-path updateでまとめて書き込む
+    batch = {}
+    _drain_pending_last_connected(batch, user_id, current_time)
+    db.reference("players").update(batch)